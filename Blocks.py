@@ -42,6 +42,7 @@ class Door(Block, Interactive):
             self.solid = False
             self.light_resistance = 0
             self.texture = self.opened_texture
+        self.refresh_tile()
 
     def can_interact(self, other: Any) -> bool:
         return True
@@ -0,0 +1,99 @@
+from typing import Any, Dict, List, Tuple
+from array import array
+
+
+class BroadPhase:
+    """
+    Description: Frame level broad phase for moving particles. The swept
+    bounding boxes of all particles moving during the frame are gathered into
+    arrays and swept along the x-axis after sorting, boxes overlapping on
+    both axes are reported as candidate pairs for the narrow phase.
+
+    === Private Attributes ===
+    - _ids: Ids of the moving particles
+    - _maps: Names of the maps the moving particles are in
+    - _min_x: Left edges of the swept bounding boxes
+    - _min_y: Top edges of the swept bounding boxes
+    - _max_x: Right edges of the swept bounding boxes
+    - _max_y: Bottom edges of the swept bounding boxes
+    - _pairs: Deduplicated candidate pairs of the current frame, the smaller
+        id comes first in each pair
+    - _partners: Candidate partners of each moving particle
+    """
+    _ids: array
+    _maps: List[str]
+    _min_x: array
+    _min_y: array
+    _max_x: array
+    _max_y: array
+    _pairs: List[Tuple[int, int]]
+    _partners: Dict[int, List[int]]
+
+    def __init__(self) -> None:
+        self.clear()
+
+    def __contains__(self, pid: int) -> bool:
+        return pid in self._partners
+
+    def clear(self) -> None:
+        """ Discard all boxes and pairs of the previous frame """
+        self._ids = array('i')
+        self._maps = []
+        self._min_x = array('d')
+        self._min_y = array('d')
+        self._max_x = array('d')
+        self._max_y = array('d')
+        self._pairs = []
+        self._partners = {}
+
+    def add(self, particle: Any, dx: float, dy: float) -> None:
+        """ Add the swept bounding box of the particle moving by (dx, dy)
+        during this frame
+        """
+        self._ids.append(particle.id)
+        self._maps.append(particle.map_name)
+        self._min_x.append(min(particle.x, particle.x + dx))
+        self._min_y.append(min(particle.y, particle.y + dy))
+        self._max_x.append(max(particle.x, particle.x + dx) +
+                           particle.diameter)
+        self._max_y.append(max(particle.y, particle.y + dy) +
+                           particle.diameter)
+        self._partners[particle.id] = []
+
+    def sweep(self) -> List[Tuple[int, int]]:
+        """ Compute and return the candidate pairs of the added boxes
+
+        >>> class Box:
+        ...     def __init__(self, pid, x, y):
+        ...         self.id, self.x, self.y = pid, x, y
+        ...         self.diameter, self.map_name = 10, 'map'
+        >>> phase = BroadPhase()
+        >>> phase.add(Box(1, 0, 0), 5, 0)
+        >>> phase.add(Box(2, 12, 0), 0, 0)
+        >>> phase.add(Box(3, 12, 30), 0, 0)
+        >>> phase.add(Box(0, 5, 25), 0, 10)
+        >>> phase.sweep()
+        [(1, 2), (0, 3)]
+        >>> phase.get_partners(3)
+        [0]
+        """
+        order = sorted(range(len(self._ids)), key=self._min_x.__getitem__)
+        active = []
+        for i in order:
+            left = self._min_x[i]
+            active = [j for j in active if self._max_x[j] >= left]
+            for j in active:
+                if self._maps[i] == self._maps[j] and \
+                        self._min_y[i] <= self._max_y[j] and \
+                        self._min_y[j] <= self._max_y[i]:
+                    a = self._ids[i]
+                    b = self._ids[j]
+                    self._pairs.append((min(a, b), max(a, b)))
+                    self._partners[a].append(b)
+                    self._partners[b].append(a)
+            active.append(i)
+        return self._pairs
+
+    def get_partners(self, pid: int) -> List[int]:
+        """ Return the candidate partners of the moving particle """
+        return self._partners.get(pid, [])
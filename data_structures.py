@@ -2,7 +2,7 @@ from typing import Any, List, Callable, Tuple
 from error import EmptyStackError
 from functools import cmp_to_key
 from bisect import bisect_right
-from collections import deque
+from collections import deque, OrderedDict
 
 
 # Stack
@@ -326,6 +326,102 @@ class WeightedPriorityQueue:
         return self._weights[key]
 
 
+class LRUCache:
+    """
+    Description: A cache of items bounded by their total weight, the least
+    recently used items are evicted once the budget is exceeded. Items
+    heavier than the whole budget are not stored.
+
+    === Public attributes ===
+    budget: The maximum total weight of the stored items
+    weight: The total weight of the stored items
+    hits: Number of lookups that found their item
+    misses: Number of lookups that did not find their item
+    evictions: Number of items evicted to stay within the budget
+
+    === Private attributes ===
+    _items: Stored items and their weights, the least recently used first
+    _weigh: The callable function used to weigh items
+
+    === Representation Invariants ===
+    - weight <= budget
+    """
+    budget: int
+    weight: int
+    hits: int
+    misses: int
+    evictions: int
+    _items: OrderedDict
+    _weigh: Callable[[Any], int]
+
+    def __init__(self, budget: int, weigh: Callable[[Any], int]) -> None:
+        self.budget = budget
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._weigh = weigh
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: Any) -> Any:
+        """ Return the item of the key and mark it as the most recently used,
+        return None if it is not stored
+
+        >>> cache = LRUCache(5, len)
+        >>> cache.put('a', 'aa')
+        >>> cache.put('b', 'bb')
+        >>> cache.get('a')
+        'aa'
+        >>> cache.put('c', 'cc')
+        >>> cache.get('b') is None
+        True
+        >>> (cache.hits, cache.misses, cache.evictions, cache.weight)
+        (1, 1, 1, 4)
+        """
+        try:
+            item = self._items[key][0]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item
+
+    def put(self, key: Any, item: Any) -> None:
+        """ Store the item under the key as the most recently used item """
+        self.pop(key)
+        weight = self._weigh(item)
+        if weight > self.budget:
+            return
+        while self.weight + weight > self.budget:
+            _, evicted = self._items.popitem(last=False)
+            self.weight -= evicted[1]
+            self.evictions += 1
+        self._items[key] = (item, weight)
+        self.weight += weight
+
+    def pop(self, key: Any) -> Any:
+        """ Remove and return the item of the key, return None if it is not
+        stored
+        """
+        item = self._items.pop(key, None)
+        if item is None:
+            return None
+        self.weight -= item[1]
+        return item[0]
+
+    def clear(self) -> None:
+        """ Remove all stored items """
+        self._items.clear()
+        self.weight = 0
+
+
 def _test_comparator(i1: Any, i2: Any) -> int:
     return 1
 
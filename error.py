@@ -114,3 +114,12 @@ class UnknownAttributeError(Exception):
     def __str__(self) -> str:
         """ Return a string representation of this error. """
         return 'All variables must have prefixes for evaluation!'
+
+
+class UnknownLightingModeError(Exception):
+    """ Exception raised when the lighting mode of a level is unknown.
+    """
+
+    def __str__(self) -> str:
+        """ Return a string representation of this error. """
+        return 'The given lighting mode does not exist!'
@@ -1,5 +1,6 @@
 import math
 import pygame
+import numpy as np
 from effect import *
 from particles import *
 from Creatures import NPC, Player
@@ -8,8 +9,12 @@ from utilities import Positional, Staminaized, UpdateReq
 from expression_trees import MultiObjectsEvaluator
 from ifstream_object_constructor import IfstreamObjectConstructor
 from settings import *
-from data_structures import PriorityQueue
 from input_processor import InputProcessor
+from spatial_index import SpatialIndex, TileBitmap
+from lighting import LightMap
+from tile_layer import TileLayer
+from render_list import RenderList
+from data_structures import Queue
 import os
 import public_namespace
 
@@ -23,19 +28,28 @@ class GameMap:
     height: height of the map (in tiles)
     width: width of the map (in tiles)
     all_particles: All particles on this map
-    content: All particles on this map stored in map format
+    content: Spatial index of all particles on this map
+    typed_content: Spatial indexes of particles of each type in INDEXED_TYPES
     tiles: All tiles on this map
+    solid_tiles: Tiles occupied by a wall
+    light_map: Brightness of the tiles on this map
+    tile_layer: Pre-rendered tiles of this map
     """
     name: str
     tile_size: int
     width: int
     height: int
     all_particles: set[int]
-    content: List[List[Set[int]]]
+    content: SpatialIndex
+    typed_content: dict[type, SpatialIndex]
     tiles: List[List[int]]
+    solid_tiles: TileBitmap
+    light_map: LightMap
+    tile_layer: TileLayer
 
     def __init__(self, location: str,
-                 look_up: dict[str, IfstreamObjectConstructor]) -> None:
+                 look_up: dict[str, IfstreamObjectConstructor],
+                 lighting: str = FLOOD_LIGHTING) -> None:
         self.tile_size = TILE_SIZE
         with open(location, 'r') as file:
             lines = file.readlines()
@@ -45,12 +59,21 @@ class GameMap:
             self.height = int(info[2])
             rows = lines[1:]
             self.all_particles = set()
-            self.content = [[set() for j in range(self.width)]
-                            for i in range(self.height)]
+            self.content = SpatialIndex(self.width, self.height)
             self.tiles = [[-1 for j in range(self.width)]
                           for i in range(self.height)]
             public_namespace.game_map[self.name] = self.content
+            self.typed_content = {}
+            for tp in INDEXED_TYPES:
+                self.typed_content[tp] = SpatialIndex(self.width, self.height)
+            public_namespace.typed_map[self.name] = self.typed_content
             public_namespace.tile_map[self.name] = self.tiles
+            self.solid_tiles = TileBitmap(self.width, self.height)
+            public_namespace.solid_map[self.name] = self.solid_tiles
+            self.light_map = LightMap(self.width, self.height, lighting)
+            public_namespace.light_map[self.name] = self.light_map
+            self.tile_layer = TileLayer(self.tiles, self.width, self.height)
+            public_namespace.tile_layer[self.name] = self.tile_layer
             for i in range(len(rows)):
                 pos_y = i * TILE_SIZE
                 row = rows[i].rstrip()
@@ -68,6 +91,11 @@ class GameMap:
                         particle = pre_p.construct(ext)
                         if isinstance(particle, Block):
                             self.tiles[i][j] = particle.id
+            for row in self.tiles:
+                for block in row:
+                    if not block == -1:
+                        Block.block_group[block].refresh_tile()
+            self.light_map.update()
 
     def update_contents(self) -> None:
         for particle in self.all_particles.copy():
@@ -94,8 +122,13 @@ class Camera(Positional):
     - max_y: max y-coordinate of the camera on the current map
     - min_x: minimum y-coordinate of the camera on the current map
     - min_y: minimum y-coordinate of the camera on the current map
+    - smooth_shade: Whether the shade overlay is scaled bilinearly
+
+    === Private Attributes ===
+    - _render_list: Blits of the displayed particles of the current frame
+    - _last_view: Map, position and scale of the previous display
+    - _last_light: Brightness of the tiles shaded by the previous display
     """
-    shades = {}
     game_maps: dict[str, GameMap]
     height: int
     width: int
@@ -104,6 +137,10 @@ class Camera(Positional):
     max_y: int
     min_x: int
     min_y: int
+    smooth_shade: bool
+    _render_list: RenderList
+    _last_view: Optional[Tuple[str, float, float, float]]
+    _last_light: Optional[np.ndarray]
 
     def __init__(self, particle: Particle,
                  height: int, width: int,
@@ -115,6 +152,10 @@ class Camera(Positional):
         self.height = height
         self.min_x = 0
         self.min_y = 0
+        self.smooth_shade = SMOOTH_SHADE
+        self._render_list = RenderList()
+        self._last_view = None
+        self._last_light = None
         self.sync()
 
     def sync(self):
@@ -141,12 +182,22 @@ class Camera(Positional):
         elif self.y < self.min_y:
             self.y = self.min_y
 
-    def get_displaying_particles(self) -> Tuple[Set[Tuple[int, float, float]],
-                                                Set[Tuple[
-                                                    Tuple[float, float], int]]]:
+    def get_tile_rect(self) -> Tuple[int, int, int, int]:
+        """ Return the rect of tiles seen by this camera in the form of
+        (start_row, start_col, end_row, end_col)
+        """
+        return (int(self.y // TILE_SIZE), int(self.x // TILE_SIZE),
+                int((self.y + self.height / public_namespace.scale) //
+                    TILE_SIZE),
+                int((self.x + self.width / public_namespace.scale) //
+                    TILE_SIZE))
+
+    def get_window(self) -> Tuple[int, int, int, int, int, int]:
+        """ Return the rect of tiles displayed by this camera and the screen
+        position of its first tile in the form of
+        (start_row, start_col, end_row, end_col, begin_x, begin_y)
+        """
         size = math.ceil(TILE_SIZE * public_namespace.scale)
-        current_map = self.game_maps[self.map_name]
-        displaying = set()
         start_row = int(self.y // TILE_SIZE)
         first_tile_pixel_y = math.ceil((self.y - start_row * TILE_SIZE) *
                                        public_namespace.scale)
@@ -157,16 +208,34 @@ class Camera(Positional):
                                        public_namespace.scale)
         offset_x = size - first_tile_pixel_x
         end_col = start_col + math.ceil((self.width - offset_x) / size)
-        shades = set()
+        return start_row, start_col, end_row, end_col, -first_tile_pixel_x, \
+            -first_tile_pixel_y
+
+    def get_displaying_particles(self) -> Tuple[List[Tuple[int, float, float]],
+                                                Tuple[pygame.Surface,
+                                                      Optional[pygame.Surface],
+                                                      Tuple[int, int]]]:
+        """ Return the lit particles to be displayed with their screen
+        positions in the order of their id, except the tiles pre-rendered
+        by the tile layer, and the shade over the displayed tiles
+        """
+        size = math.ceil(TILE_SIZE * public_namespace.scale)
+        current_map = self.game_maps[self.map_name]
+        light_map = current_map.light_map
+        tiles = current_map.tiles
+        displaying = []
+        start_row, start_col, end_row, end_col, begin_x, begin_y = \
+            self.get_window()
         in_queue = set()
-        begin_x = -first_tile_pixel_x
-        begin_y = -first_tile_pixel_y
+        light = light_map.brightness[start_row:end_row + 1,
+                                     start_col:end_col + 1]
+        window = light.max(axis=2).tolist()
         # add tiles & entities to the queue
         row_count = 0
         for i in range(start_row, end_row + 1):
             col_count = 0
             for j in range(start_col, end_col + 1):
-                ps = current_map.content[i][j]
+                ps = current_map.content.query_tile(i, j)
                 for idti in ps:
                     if idti in in_queue:
                         continue
@@ -175,13 +244,13 @@ class Camera(Positional):
                     block_x = begin_x + col_count * size
                     block_y = begin_y + row_count * size
                     if isinstance(item, Block):
+                        if tiles[i][j] == idti:
+                            continue
                         display_x = block_x
                         display_y = block_y
-                        brightness = item.get_stat("brightness")
+                        brightness = window[row_count][col_count]
                         if brightness > 0:
-                            displaying.add((idti, display_x, display_y))
-                        shades.add(((display_x, display_y), 256 -
-                                    brightness))
+                            displaying.append((idti, display_x, display_y))
                     else:
                         bx = j * TILE_SIZE
                         by = i * TILE_SIZE
@@ -189,45 +258,59 @@ class Camera(Positional):
                                 item.x - bx) * public_namespace.scale
                         display_y = block_y + (
                                 item.y - by) * public_namespace.scale
-                        flag = False
-                        tiles = item.get_tiles_in_contact()
-                        for t in tiles:
-                            if t.get_stat("brightness") > 0:
-                                flag = True
-                        if flag:
-                            displaying.add((idti, display_x, display_y))
+                        if light_map.is_lit(item.get_tile_rect()):
+                            displaying.append((idti, display_x, display_y))
                 col_count += 1
             row_count += 1
-        return displaying, shades
-
-    def display(self, screen: pygame.Surface):
-        """ Display the content onto the screen by their priority
+        # particles overlapping within a layer are drawn in a stable order
+        displaying.sort()
+        shade, tint = get_shade(light, end_col - start_col + 1,
+                                end_row - start_row + 1, size,
+                                self.smooth_shade)
+        return displaying, (shade, tint, (begin_x, begin_y))
+
+    def display(self, screen: pygame.Surface) -> Optional[List[pygame.Rect]]:
+        """ Display the content onto the screen by their priority. Return the
+        areas of the screen that may differ from the previous display, or None
+        if the view moved and the whole screen changed.
         """
-        displaying, shades = self.get_displaying_particles()
-        queue = PriorityQueue(lower_priority_over_id)
-        new_dict = {}
-        for item in displaying:
-            new_dict[item[0]] = (item[1], item[2])
-
-        # display items by their priority
-        for item in new_dict:
-            queue.enqueue(Particle.particle_group[item])
-        font = pygame.font.Font(None, 25)
-        while not queue.is_empty():
-            item = queue.dequeue()
-            item.display(screen, new_dict[item.id])
-            if isinstance(item, Block):
-                row = item.y // TILE_SIZE
-                col = item.x // TILE_SIZE
-                ids = str(public_namespace.game_map[item.map_name][row][col])
-                # txt = font.render(ids, False, (0, 255, 255))
-                # screen.blit(txt, new_dict[item.id] + (30, 30))
+        displaying, shade = self.get_displaying_particles()
+        start_row, start_col, end_row, end_col, begin_x, begin_y = \
+            self.get_window()
+        current_map = self.game_maps[self.map_name]
+        rects = current_map.tile_layer.display(
+            screen, start_row, start_col, end_row, end_col, begin_x, begin_y)
+        # display items by their priority, then by their id
+        for pid, x, y in displaying:
+            item = Particle.particle_group[pid]
+            self._render_list.add(item.display_priority,
+                                  *item.get_blit((x, y)))
+        rects.extend(self._render_list.submit(screen))
         # display brightness
-
-        for s in shades:
-            location = s[0]
-            shade = get_shade(s[1])
-            screen.blit(shade, location)
+        if shade[1] is not None:
+            screen.blit(shade[1], shade[2], special_flags=pygame.BLEND_MULT)
+        screen.blit(shade[0], shade[2])
+
+        view = (self.map_name, self.x, self.y, public_namespace.scale)
+        light = current_map.light_map.brightness[start_row:end_row + 1,
+                                                 start_col:end_col + 1]
+        last_view, last_light = self._last_view, self._last_light
+        self._last_view, self._last_light = view, light.copy()
+        if not (view == last_view and light.shape == last_light.shape):
+            return None
+        changed = np.argwhere((light != last_light).any(axis=2))
+        if len(changed) > 0:
+            size = math.ceil(TILE_SIZE * public_namespace.scale)
+            top, left = changed.min(axis=0)
+            bottom, right = changed.max(axis=0)
+            rect = pygame.Rect(begin_x + left * size, begin_y + top * size,
+                               (right - left + 1) * size,
+                               (bottom - top + 1) * size)
+            if self.smooth_shade:
+                # bilinear scaling blends each tile into its neighbours
+                rect.inflate_ip(2 * size, 2 * size)
+            rects.append(rect)
+        return rects
 
 
 class Level:
@@ -238,6 +321,7 @@ class Level:
     difficulty: difficulty of the level
     goal: The goal of the level
     running: Whether this level is running
+    lighting: The lighting mode of the maps, one of LIGHTING_MODES
 
     === Private Attributes ===
     _game_maps: Loaded game maps, accessed by their names
@@ -245,12 +329,21 @@ class Level:
     _particle_names: Names of the file that stores predefined particles info
     _camera: Camera for this level
     _initialized: Whether the level has been initialized
+    _bars: Displayed stat bars by their names, with the filled width in
+        pixels they were drawn with
+    _inventory_panel: Displayed inventory panel, with the items and stacks it
+        was built with
+    _prerender_scale: Scale bucket the rotations of active particles are
+        being pre-rendered at
+    _prerender_queue: Ids of active particles and rotation steps left to be
+        pre-rendered at _prerender_scale
 
     === Representation Invariants ===
     - difficulty must be an integer from 0 - 3
     """
     difficulty: int
     goal: MultiObjectsEvaluator
+    lighting: str
     _game_maps: dict[str, GameMap]
     _camera: Camera
     _map_names: List[str]
@@ -258,13 +351,18 @@ class Level:
     _item_names: List[str]
     _items: List[str]
     _initialized: bool
-    fonts: dict[str, pygame.font.Font]
     texts: dict[str, pygame.Surface]
+    _bars: dict[str, Tuple[int, pygame.Surface]]
+    _inventory_panel: Optional[Tuple[Tuple[Tuple[str, int, int], ...],
+                                     pygame.Surface]]
+    _prerender_scale: Optional[float]
+    _prerender_queue: Queue
 
     def __init__(self, asset: List[str]) -> None:
         self._map_names = []
         self._particle_names = []
         self._item_names = []
+        self.lighting = FLOOD_LIGHTING
         for line in asset:
             line = line.rstrip().split('=')
             if line[0] == 'maps':
@@ -273,11 +371,16 @@ class Level:
                 self._particle_names.append(line[1])
             elif line[0] == 'predefined_items':
                 self._item_names.append(line[1])
+            elif line[0] == 'lighting':
+                self.lighting = line[1]
         self.difficulty = 0  # default difficulty
         self._initialized = False
         self._game_maps = {}
-        self.fonts = {}
         self.texts = {}
+        self._bars = {}
+        self._inventory_panel = None
+        self._prerender_scale = None
+        self._prerender_queue = Queue()
 
     def _load_items(self) -> None:
         """ Load predefined items to the public namespace """
@@ -300,21 +403,23 @@ class Level:
 
         for m in self._map_names:
             name = os.path.join("assets/maps", m + ".txt")
-            game_map = GameMap(name, look_up)
+            game_map = GameMap(name, look_up, self.lighting)
             self._game_maps[game_map.name] = game_map
 
     def _load_texts(self):
-        self.fonts['player_info'] = pygame.font.Font(None, 25)
-        self.texts['health_bar'] = self.fonts[
-            'player_info'].render("Health", True, (255, 255, 0))
-        self.texts['resource_bar'] = self.fonts[
-            'player_info'].render("Mana", True, (0, 100, 255))
-        self.texts['stamina_bar'] = self.fonts[
-            'player_info'].render("Stamina", True, (0, 255, 0))
-
-    def run(self, screen: pygame.Surface, difficulty=0):
+        self.texts['health_bar'] = public_namespace.render_text(
+            "Health", (255, 255, 0))
+        self.texts['resource_bar'] = public_namespace.render_text(
+            "Mana", (0, 100, 255))
+        self.texts['stamina_bar'] = public_namespace.render_text(
+            "Stamina", (0, 255, 0))
+
+    def run(self, screen: pygame.Surface, difficulty=0) \
+            -> Optional[List[pygame.Rect]]:
         """
-        Run the level with the given setting
+        Run the level with the given setting, return the areas of the screen
+        that may differ from the previous frame or None if the whole screen
+        changed
         """
         if not self._initialized:
             _load_assets()
@@ -344,19 +449,24 @@ class Level:
         # player input and other game actions
         pressed_keys = public_namespace.input_handler.get_key_pressed()
         if pygame.K_UP in pressed_keys:
-            public_namespace.scale += 0.01
-            if public_namespace.scale > MAX_CAMERA_SCALE:
-                public_namespace.scale = MAX_CAMERA_SCALE
+            public_namespace.zoom += 0.01
+            if public_namespace.zoom > MAX_CAMERA_SCALE:
+                public_namespace.zoom = MAX_CAMERA_SCALE
         if pygame.K_DOWN in pressed_keys:
-            public_namespace.scale -= 0.01
-            if public_namespace.scale < MIN_CAMERA_SCALE:
-                public_namespace.scale = MIN_CAMERA_SCALE
+            public_namespace.zoom -= 0.01
+            if public_namespace.zoom < MIN_CAMERA_SCALE:
+                public_namespace.zoom = MIN_CAMERA_SCALE
+        public_namespace.scale = public_namespace.snap_scale(
+            public_namespace.zoom)
+        if pygame.K_UP not in pressed_keys and \
+                pygame.K_DOWN not in pressed_keys:
+            # pre-render once the zoom settles on a bucket
+            self._prerender_rotations()
         active_map = self._game_maps[player.map_name]
         active_particles = get_particles_in_radius(player,
                                                    PARTICLE_UPDATE_RADIUS, None,
                                                    True)
         # particle status update
-        tiles = []
         particles = []
         for particle in active_particles:
             particles.append(particle)
@@ -365,8 +475,6 @@ class Level:
                 particle.action()
             if isinstance(particle, UpdateReq):
                 particle.check_for_update()
-            if isinstance(particle, Block):
-                tiles.append(particle)
 
         # execute particle actions
         for i in range(Staminaized.action_queue.get_size()):
@@ -374,6 +482,18 @@ class Level:
             particle.execute_action(name, args)
         Staminaized.action_queue.reset()
 
+        # broad phase of moving particles
+        broad_phase = DisplacableParticle.broad_phase
+        broad_phase.clear()
+        for particle in particles:
+            if isinstance(particle, DisplacableParticle) and \
+                    particle.id in Particle.particle_group:
+                vx = particle.get_stat('vx')
+                vy = particle.get_stat('vy')
+                if not (vx == 0 and vy == 0):
+                    broad_phase.add(particle, vx, vy)
+        broad_phase.sweep()
+
         # update particle status
         queue = UpdateReq.update_queue
         while not queue.is_empty():
@@ -381,20 +501,45 @@ class Level:
         active_map.update_contents()
 
         # lighting
-        for block in tiles:
-            if block.get_stat('light_source') > 0:
-                block.light()
+        self._camera.sync()
+        active_map.light_map.update(LIGHT_UPDATE_BUDGET,
+                                    self._camera.get_tile_rect())
 
         # display
-        self._camera.sync()
-        self._camera.display(screen)
-        self.player_info_display(player, screen)
+        rects = self._camera.display(screen)
+        hud = self.player_info_display(player, screen)
 
         # reset buffer
         for particle in particles:
             particle.reset()
-
-    def player_info_display(self, player: Player, screen: pygame.Surface):
+        if rects is None:
+            return None
+        return rects + hud
+
+    def _prerender_rotations(self) -> None:
+        """ Pre-render the rotations of the active particles at the scale
+        bucket in use, at most ROTATION_PRERENDER_BUDGET of them per frame.
+        Rotations of the previous bucket are left to the texture cache.
+        """
+        if not public_namespace.scale == self._prerender_scale:
+            self._prerender_scale = public_namespace.scale
+            self._prerender_queue = Queue()
+            for pid in ActiveParticle.ap_group:
+                for step in range(ROTATION_STEPS):
+                    self._prerender_queue.enqueue((pid, step))
+        for _ in range(ROTATION_PRERENDER_BUDGET):
+            if self._prerender_queue.is_empty():
+                return
+            pid, step = self._prerender_queue.dequeue()
+            if pid in ActiveParticle.ap_group:
+                ActiveParticle.ap_group[pid].prerender_rotation(step)
+
+    def player_info_display(self, player: Player, screen: pygame.Surface) \
+            -> List[pygame.Rect]:
+        """ Display the stats and the inventory of the player, return the
+        areas of the screen drawn on
+        """
+        rects = []
         health_bar_width = 300
         health_bar_height = 12
         resource_bar_width = 200
@@ -403,44 +548,65 @@ class Level:
         stamina_bar_width = 250
 
         health_percent = player.health / player.max_health
-        if health_percent < 0:
-            health_percent = 0
-        health_bar = pygame.Surface((health_percent * health_bar_width,
-                                     health_bar_height))
-        health_bar.fill((255, 0, 0))
-        screen.blit(self.texts['health_bar'], (80, 60))
-        screen.blit(health_bar, (80, 80))
+        health_bar = self._get_bar('health_bar', health_percent,
+                                   health_bar_width, health_bar_height,
+                                   (255, 0, 0))
+        rects.append(screen.blit(self.texts['health_bar'], (80, 60)))
+        rects.append(screen.blit(health_bar, (80, 80)))
 
         stamina_percent = player.stamina / player.max_stamina
-        stamina_bar = pygame.Surface((stamina_percent * stamina_bar_width,
-                                      stamina_bar_height))
-        stamina_bar.fill((0, 255, 0))
-        screen.blit(self.texts['stamina_bar'], (80, 100))
-        screen.blit(stamina_bar, (80, 120))
+        stamina_bar = self._get_bar('stamina_bar', stamina_percent,
+                                    stamina_bar_width, stamina_bar_height,
+                                    (0, 255, 0))
+        rects.append(screen.blit(self.texts['stamina_bar'], (80, 100)))
+        rects.append(screen.blit(stamina_bar, (80, 120)))
 
         mana_percent = player.mana / player.max_mana
-        mana_bar = pygame.Surface((mana_percent * resource_bar_width,
-                                   resource_bar_height))
-        mana_bar.fill((0, 255, 255))
-        screen.blit(self.texts['resource_bar'], (80, 140))
-        screen.blit(mana_bar, (80, 160))
+        mana_bar = self._get_bar('resource_bar', mana_percent,
+                                 resource_bar_width, resource_bar_height,
+                                 (0, 255, 255))
+        rects.append(screen.blit(self.texts['resource_bar'], (80, 140)))
+        rects.append(screen.blit(mana_bar, (80, 160)))
 
         keys = public_namespace.input_handler.get_key_pressed()
         if pygame.K_TAB in keys:
-            item_text = self.fonts['player_info'].render('Items:', True,
-                                                         (255, 255, 0))
-            rect = pygame.Surface((300, 500))
-            rect.fill((0, 0, 0))
-            rect.set_alpha(120)
-            pos_x = 80
-            pos_y = 200
-            rect.blit(item_text, (10, 10))
-            sx, sy = 10, 10 + ITEM_IMAGE_SIZE
-            size = (ITEM_IMAGE_SIZE, ITEM_IMAGE_SIZE)
-            for item in player.inventory.items:
-                item.display(rect, (sx, sy), size, True)
-                sy += ITEM_IMAGE_SIZE + 5
-            screen.blit(rect, (pos_x, pos_y))
+            rects.append(screen.blit(self._get_inventory_panel(player),
+                                     (80, 200)))
+        return rects
+
+    def _get_bar(self, name: str, percent: float, width: int, height: int,
+                 color: Tuple[int, int, int]) -> pygame.Surface:
+        """ Return the bar of the given name filled to the percentage, the bar
+        is only redrawn once its filled width in pixels changes
+        """
+        filled = int(max(percent, 0) * width)
+        if name not in self._bars or not self._bars[name][0] == filled:
+            bar = pygame.Surface((filled, height))
+            bar.fill(color)
+            self._bars[name] = (filled, bar)
+        return self._bars[name][1]
+
+    def _get_inventory_panel(self, player: Player) -> pygame.Surface:
+        """ Return the panel displaying the inventory of the player, the panel
+        is only rebuilt once the items or their stacks change
+        """
+        items = player.inventory.items
+        key = tuple((item.name, item.stack, item.max_stack) for item in items)
+        if self._inventory_panel is not None and \
+                self._inventory_panel[0] == key:
+            return self._inventory_panel[1]
+        item_text = public_namespace.render_text('Items:', (255, 255, 0))
+        panel = pygame.Surface((300, 500))
+        panel.fill((0, 0, 0))
+        panel.set_alpha(120)
+        panel.blit(item_text, (10, 10))
+        sx, sy = 10, 10 + ITEM_IMAGE_SIZE
+        size = (ITEM_IMAGE_SIZE, ITEM_IMAGE_SIZE)
+        for item in items:
+            item.display(panel, (sx, sy), size, True)
+            sy += ITEM_IMAGE_SIZE + 5
+        self._inventory_panel = (key, panel)
+        return panel
 
     def exit(self):
         """
@@ -448,6 +614,10 @@ class Level:
         """
         self.difficulty = 0  # reset difficulty
         self._game_maps = {}
+        self._bars = {}
+        self._inventory_panel = None
+        self._prerender_scale = None
+        self._prerender_queue = Queue()
 
 
 class Game:
@@ -461,6 +631,10 @@ class Game:
         _level_selecting: whether the game is on title screen
         _level_running: whether the game is running on a level
         _selected_level: Selected level
+        _dirty_rects: Whether only the changed areas of the screen are
+            presented each frame
+        _last_rects: Areas of the screen drawn on in the previous frame, None
+            if the whole screen was presented
     """
     _screen: pygame.Surface
     _levels: List[Level]
@@ -468,6 +642,8 @@ class Game:
     _level_selecting: bool
     _level_running: bool
     _selected_level: int
+    _dirty_rects: bool
+    _last_rects: Optional[List[pygame.Rect]]
 
     def start(self) -> None:
         """
@@ -492,6 +668,8 @@ class Game:
         self._screen = pygame.display.set_mode(SCREEN_SIZE)
         pygame.display.set_caption(CAPTION)
         self.frame_rate = FPS
+        self._dirty_rects = DIRTY_RECT_PRESENTATION
+        self._last_rects = None
 
     def _load_level(self) -> None:
         """
@@ -518,36 +696,35 @@ class Game:
             self._screen.fill((0, 0, 0))
             public_namespace.input_handler.process_input(pygame.event.get(),
                                                          pygame.mouse.get_pos())
+            rects = None
             if self._level_selecting:
                 self._selected_level = 0
                 self._level_selecting = False
                 self._level_running = True
             elif self._level_running:
                 level = self._levels[self._selected_level]
-                level.run(self._screen)
-            self._screen.blit(cursor_image, pygame.mouse.get_pos())
+                rects = level.run(self._screen)
+            cursor = self._screen.blit(cursor_image, pygame.mouse.get_pos())
             # FPS
-            font = pygame.font.Font(None, 25)
-            text = font.render("FPS:" + str(round(clock.get_fps())), True,
-                               (255, 255, 255))
-            self._screen.blit(text, (0, 0))
-            pygame.display.flip()
+            fps = public_namespace.blit_glyphs(
+                self._screen, "FPS:" + str(round(clock.get_fps())), (0, 0),
+                (255, 255, 255))
+            if rects is not None:
+                rects += [cursor, fps]
+            self._present(rects)
         pygame.quit()
 
-
-def higher_id(p1: Particle, p2: Particle) -> int:
-    return p1.id - p2.id
-
-
-def lower_display_priority(p1: Particle, p2: Particle) -> int:
-    return p2.display_priority - p1.display_priority
-
-
-def lower_priority_over_id(p1: Particle, p2: Particle) -> int:
-    """ Sort by non-decreasing order """
-    if p1.display_priority == p2.display_priority:
-        return p2.id - p1.id
-    return p2.display_priority - p1.display_priority
+    def _present(self, rects: Optional[List[pygame.Rect]]) -> None:
+        """ Present the frame, only the given areas and the areas drawn on in
+        the previous frame are presented in dirty rect mode. The whole screen
+        is presented if rects is None.
+        """
+        if not self._dirty_rects or rects is None or \
+                self._last_rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects + self._last_rects)
+        self._last_rects = rects
 
 
 def _load_assets():
@@ -560,28 +737,38 @@ def _load_assets():
         pic = pygame.image.load(
             os.path.join(path, p)).convert_alpha()
         public_namespace.images[p] = pic
-        # Loaded images are being accessed by 4 parameters
-        # in the order of name -> size -> direction -> alpha value
-        tup = (p, pic.get_size(), 0, 0)
-        public_namespace.par_images[tup] = pic
     path = "assets/sounds"
     paths = os.listdir(path)
     for p in paths:
         public_namespace.sounds[p] = pygame.mixer.Sound(os.path.join(path, p))
 
 
-def get_shade(alpha: int) -> pygame.Surface:
-    """ Return the shade with the given alpha value """
-    try:
-        return Camera.shades[public_namespace.scale][alpha].copy()
-    except KeyError:
-        size = math.ceil(public_namespace.scale * TILE_SIZE)
-        surface = pygame.Surface((size, size))
-        surface.fill((0, 0, 0))
-        surface.set_alpha(alpha)
-        try:
-            Camera.shades[public_namespace.scale][alpha] = surface
-        except KeyError:
-            Camera.shades[public_namespace.scale] = {}
-            Camera.shades[public_namespace.scale][alpha] = surface
-        return surface.copy()
+def get_shade(light: np.ndarray, width: int, height: int,
+              size: int, smooth: bool) -> Tuple[pygame.Surface,
+                                                Optional[pygame.Surface]]:
+    """ Return the shade over a window of width x height tiles of the given
+    size and the tint of the coloured lights in it, the tint is None if all
+    lights are white. light holds the brightness of each channel of the
+    tiles in the window, indexed by [row, col, channel]. Tiles missing from
+    light are not shaded.
+    """
+    rows, cols = light.shape[:2]
+    brightest = light.max(axis=2)
+    alpha = np.zeros((height, width), dtype=np.int32)
+    alpha[:rows, :cols] = MAX_BRIGHTNESS - brightest
+    surface = pygame.Surface((width, height), pygame.SRCALPHA)
+    surface.fill((0, 0, 0, 0))
+    pygame.surfarray.pixels_alpha(surface)[:] = np.clip(alpha, 0, 255).T
+    # channels relative to the brightest one, multiplied onto the screen
+    color = np.full((height, width, 3), 255, dtype=np.int32)
+    color[:rows, :cols] = np.where(
+        brightest[..., None] > 0,
+        light * 255 // np.maximum(brightest, 1)[..., None], 255)
+    tint = None
+    if not (color == 255).all():
+        tint = pygame.Surface((width, height))
+        pygame.surfarray.blit_array(tint, color.transpose(1, 0, 2))
+    scale = pygame.transform.smoothscale if smooth else \
+        pygame.transform.scale
+    return scale(surface, (width * size, height * size)), \
+        None if tint is None else scale(tint, (width * size, height * size))
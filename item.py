@@ -66,13 +66,13 @@ class Item:
         texture = public_namespace.get_texture_by_info(
             self.image, size, 0, 255)
         if description:
-            font = pygame.font.Font(None, 25)
-            text = font.render(self.description, True, (0, 255, 0))
+            text = public_namespace.render_text(self.description, (0, 255, 0))
             screen.blit(text, (location[0] + ITEM_IMAGE_SIZE + 10, location[1]))
             s = str(self.stack) + " / " + str(self.max_stack)
-            stack = font.render(s, True, (0, 255, 0))
-            screen.blit(stack, (location[0] + ITEM_IMAGE_SIZE + 10,
-                                location[1] + 20))
+            public_namespace.blit_glyphs(screen, s, (location[0] +
+                                                     ITEM_IMAGE_SIZE + 10,
+                                                     location[1] + 20),
+                                         (0, 255, 0))
         screen.blit(texture, location)
 
 
@@ -0,0 +1,552 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Set, Tuple
+import math
+import numpy as np
+from settings import MAX_BRIGHTNESS, FLOOD_LIGHTING, SHADOWCAST_LIGHTING, \
+    LIGHTING_MODES, SHADOWCAST_FALLOFF, DEFAULT_LIGHT_COLOR
+from error import UnknownLightingModeError
+
+Tile = Tuple[int, int]
+TileRect = Tuple[int, int, int, int]
+Color = Tuple[int, int, int]
+
+
+class LightMap:
+    """
+    Description: Brightness of every tile of a game map. Light spreads from a
+    source to the 4 neighbouring tiles and loses the light resistance of the
+    tile it leaves on every step. The contribution of each static source is
+    cached and only recomputed when the source changes or the resistance of a
+    tile it reaches changes. Dynamic lights are added every frame and only
+    last until the next update, they are drawn with precomputed LightStamps
+    where the resistance around them is uniform and spread otherwise.
+    Light is spread once per source and tinted by the colour of the source
+    afterwards, each channel keeps the brightest light reaching the tile.
+
+    In shadowcast mode light travels in straight lines instead, it is stopped
+    by opaque tiles and fades by SHADOWCAST_FALLOFF per tile of distance.
+
+    === Public Attributes ===
+    - width: width of the map (in tiles)
+    - height: height of the map (in tiles)
+    - mode: The lighting mode, one of LIGHTING_MODES
+    - brightness: Brightness of each colour channel of each tile, indexed by
+        [row, col, channel]
+
+    === Private Attributes ===
+    - _resistance: Light resistance of each tile
+    - _opaque: Whether each tile stops light in shadowcast mode
+    - _resistance_list: _resistance flattened in row-major order, used by the
+        propagation loop
+    - _sources: Light source value and colour of each static source
+    - _contributions: Flat indices of the tiles reached by each static source
+        and the brightness of each channel it gives them
+    - _reached_by: Static sources reaching each tile, keyed by flat index
+    - _static: Brightness of each tile from static sources
+    - _lights: Dynamic lights added since the last update, accessed by their
+        tile and colour
+    - _dirty: Static sources whose contribution has to be recomputed, their
+        previous contribution is kept until then
+
+    === Representation Invariants ===
+    - brightness == np.maximum(_static, brightness of dynamic lights), after
+        each update
+    """
+    width: int
+    height: int
+    mode: str
+    brightness: np.ndarray
+    _resistance: np.ndarray
+    _opaque: np.ndarray
+    _resistance_list: Optional[List[int]]
+    _sources: Dict[Tile, Tuple[int, Color]]
+    _contributions: Dict[Tile, Tuple[np.ndarray, np.ndarray]]
+    _reached_by: Dict[int, Set[Tile]]
+    _static: np.ndarray
+    _lights: Dict[Tuple[Tile, Color], int]
+    _dirty: Set[Tile]
+
+    def __init__(self, width: int, height: int,
+                 mode: str = FLOOD_LIGHTING) -> None:
+        if mode not in LIGHTING_MODES:
+            raise UnknownLightingModeError
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.brightness = np.zeros((height, width, 3), dtype=np.int32)
+        self._resistance = np.zeros((height, width), dtype=np.int32)
+        self._opaque = np.zeros((height, width), dtype=bool)
+        self._resistance_list = None
+        self._sources = {}
+        self._contributions = {}
+        self._reached_by = {}
+        self._static = np.zeros((height, width, 3), dtype=np.int32)
+        self._lights = {}
+        self._dirty = set()
+
+    def set_resistance(self, row: int, col: int, value: int) -> None:
+        """ Set the light resistance of the tile, static sources reaching the
+        tile are recomputed on the next update.
+        """
+        if self._resistance[row, col] == value:
+            return
+        self._resistance[row, col] = value
+        self._resistance_list = None
+        if self.mode == FLOOD_LIGHTING:
+            self._dirty.update(
+                self._reached_by.get(row * self.width + col, ()))
+
+    def set_opaque(self, row: int, col: int, value: bool) -> None:
+        """ Set whether the tile stops light in shadowcast mode. Static
+        sources scanning the tile are recomputed on the next update, the tile
+        can cast a shadow without being lit.
+
+        >>> light_map = LightMap(7, 7, SHADOWCAST_LIGHTING)
+        >>> light_map.set_opaque(1, 2, True)
+        >>> light_map.set_source(3, 3, 240)
+        >>> light_map.update()
+        >>> light_map.get_brightness(0, 1)
+        0
+        >>> light_map.set_opaque(0, 1, True)
+        >>> light_map.update()
+        >>> light_map.get_brightness(0, 1)
+        95
+        """
+        if self._opaque[row, col] == value:
+            return
+        self._opaque[row, col] = value
+        if self.mode == SHADOWCAST_LIGHTING:
+            for source, (light, _) in self._sources.items():
+                if max(abs(source[0] - row), abs(source[1] - col)) <= \
+                        _shadowcast_radius(light):
+                    self._dirty.add(source)
+
+    def set_source(self, row: int, col: int, value: int,
+                   color: Color = DEFAULT_LIGHT_COLOR) -> None:
+        """ Set the value and colour of the static light source on the tile,
+        0 removes the source.
+        """
+        source = (int(value), tuple(color))
+        if value <= 0 and (row, col) not in self._sources or \
+                self._sources.get((row, col)) == source:
+            return
+        if value > 0:
+            self._sources[(row, col)] = source
+        else:
+            self._sources.pop((row, col), None)
+        self._dirty.add((row, col))
+
+    def add_light(self, row: int, col: int, value: int,
+                  color: Color = DEFAULT_LIGHT_COLOR) -> None:
+        """ Light up the tile with the given value and colour until the update
+        after the next one
+        """
+        key = ((row, col), tuple(color))
+        if 0 <= row < self.height and 0 <= col < self.width and \
+                value > self._lights.get(key, 0):
+            self._lights[key] = int(value)
+
+    def update(self, budget: Optional[int] = None,
+               focus: Optional[TileRect] = None) -> None:
+        """ Recompute invalidated static sources and the dynamic lights added
+        since the last update. If budget is given, static sources stop being
+        recomputed once the tiles they reach add up to it, the rest keep
+        their previous light until a later update. Sources closer to the
+        focus are recomputed first. At least one source is recomputed per
+        update.
+
+        >>> light_map = LightMap(5, 1)
+        >>> for col in range(5):
+        ...     light_map.set_resistance(0, col, 40)
+        >>> light_map.set_source(0, 0, 100)
+        >>> light_map.update()
+        >>> light_map.brightness[..., 0].tolist()
+        [[100, 60, 20, 0, 0]]
+        >>> light_map.set_resistance(0, 1, 0)
+        >>> light_map.add_light(0, 4, 50, (0, 0, 255))
+        >>> light_map.update()
+        >>> light_map.brightness[0].tolist()
+        [[100, 100, 100], [60, 60, 60], [60, 60, 60], [20, 20, 20], [0, 0, 50]]
+        >>> light_map.update()
+        >>> light_map.get_brightness(0, 4)
+        0
+        >>> light_map = LightMap(4, 1)
+        >>> for col in range(4):
+        ...     light_map.set_resistance(0, col, 40)
+        >>> light_map.set_source(0, 0, 100)
+        >>> light_map.update()
+        >>> light_map.set_resistance(0, 1, 0)
+        >>> light_map.set_source(0, 3, 40)
+        >>> light_map.update(1, (0, 3, 0, 3))
+        >>> light_map.brightness[..., 0].tolist()
+        [[100, 60, 20, 40]]
+        >>> light_map.update(1, (0, 3, 0, 3))
+        >>> light_map.brightness[..., 0].tolist()
+        [[100, 60, 60, 40]]
+        >>> light_map = LightMap(3, 1)
+        >>> for col, resistance in enumerate([40, 40, 20]):
+        ...     light_map.set_resistance(0, col, resistance)
+        >>> light_map.set_source(0, 0, 60, (0, 0, 255))
+        >>> light_map.set_source(0, 2, 100)
+        >>> light_map.update()
+        >>> light_map.add_light(0, 2, 200, (128, 128, 0))
+        >>> light_map.update()
+        >>> light_map.brightness[0].tolist()
+        [[70, 70, 60], [90, 90, 80], [100, 100, 100]]
+        """
+        if len(self._dirty) > 0:
+            spent = 0
+            changed = []
+            for source in sorted(self._dirty,
+                                 key=lambda tile: (_distance(tile, focus),
+                                                   tile)):
+                if budget is not None and spent >= budget:
+                    break
+                self._dirty.remove(source)
+                old = self._contributions.get(source)
+                spent += self._recompute(source)
+                for contribution in (old, self._contributions.get(source)):
+                    if contribution is not None:
+                        changed.append(contribution[0])
+            if len(changed) > 0:
+                self._restore(np.unique(np.concatenate(changed)))
+        np.copyto(self.brightness, self._static)
+        flat = self.brightness.reshape(-1, 3)
+        if len(self._lights) > 0 and self.mode == SHADOWCAST_LIGHTING:
+            for tile, color in self._lights:
+                indices, values = self._shadowcast(
+                    tile[0], tile[1], self._lights[(tile, color)])
+                flat[indices] = np.maximum(flat[indices],
+                                           _tint(values, color))
+            self._lights = {}
+        elif len(self._lights) > 0:
+            # lights over uniform resistance are stamped, the others are
+            # spread in one pass per colour
+            seeds = {}
+            stamped = []
+            for tile, color in self._lights:
+                value = self._lights[(tile, color)]
+                stamp = LightStamp.get(value, int(self._resistance[tile]))
+                if stamp is not None and \
+                        stamp.fits(self._resistance, tile[0], tile[1]):
+                    stamped.append((stamp, tile, color))
+                    continue
+                if color not in seeds:
+                    seeds[color] = {}
+                seeds[color][tile[0] * self.width + tile[1]] = value
+            self._lights = {}
+            for color in seeds:
+                # the dimmest channel of the static light is a fixpoint for
+                # white light, white lights below it are dominated. Tinted
+                # light fades slower than the resistance on its dimmer
+                # channels, so coloured lights are spread without a floor.
+                floor = None
+                if color == (255, 255, 255):
+                    floor = flat.min(axis=1).tolist()
+                indices, values = self._spread(seeds[color], floor)
+                flat[indices] = np.maximum(flat[indices],
+                                           _tint(values, color))
+            # stamps are exact, they are applied after the spread so they do
+            # not take part in its pruning
+            for stamp, tile, color in stamped:
+                stamp.apply(self.brightness, tile[0], tile[1], color)
+
+    def get_brightness(self, row: int, col: int) -> int:
+        """ Return the brightness of the brightest channel of the tile, tiles
+        outside of the map are dark
+        """
+        if not (0 <= row < self.height and 0 <= col < self.width):
+            return 0
+        return int(self.brightness[row, col].max())
+
+    def is_lit(self, rect: TileRect) -> bool:
+        """ Return whether any tile covered by rect is lit """
+        return bool(self.brightness[max(rect[0], 0):rect[2] + 1,
+                                    max(rect[1], 0):rect[3] + 1].any())
+
+    def _recompute(self, source: Tile) -> int:
+        """ Recompute the contribution of the static source and return the
+        number of tiles it reaches
+        """
+        old = self._contributions.pop(source, None)
+        if old is not None:
+            for index in old[0].tolist():
+                self._reached_by[index].discard(source)
+        if source not in self._sources:
+            return 1
+        value, color = self._sources[source]
+        if self.mode == SHADOWCAST_LIGHTING:
+            indices, values = self._shadowcast(source[0], source[1], value)
+        else:
+            seed = source[0] * self.width + source[1]
+            indices, values = self._spread({seed: value}, None)
+        self._contributions[source] = (indices, _tint(values, color))
+        for index in indices.tolist():
+            if index not in self._reached_by:
+                self._reached_by[index] = set()
+            self._reached_by[index].add(source)
+        return max(len(indices), 1)
+
+    def _restore(self, indices: np.ndarray) -> None:
+        """ Rebuild the static brightness of the tiles at the given flat
+        indices from the contributions of the sources reaching them
+        """
+        static = self._static.reshape(-1, 3)
+        static[indices] = 0
+        sources = set()
+        for index in indices.tolist():
+            sources.update(self._reached_by.get(index, ()))
+        affected = np.zeros(len(static), dtype=bool)
+        affected[indices] = True
+        for source in sources:
+            reached, values = self._contributions[source]
+            inside = affected[reached]
+            reached = reached[inside]
+            static[reached] = np.maximum(static[reached], values[inside])
+
+    def _shadowcast(self, row: int, col: int, value: int) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """ Return the flat indices of the tiles lit by the light on the tile
+        in shadowcast mode, along with their brightness
+
+        >>> light_map = LightMap(5, 1, SHADOWCAST_LIGHTING)
+        >>> light_map.set_opaque(0, 3, True)
+        >>> indices, values = light_map._shadowcast(0, 1, 100)
+        >>> sorted(zip(indices.tolist(), values.tolist()))
+        [(0, 60), (1, 100), (2, 60), (3, 20)]
+        """
+        value = min(value, MAX_BRIGHTNESS)
+        radius = _shadowcast_radius(value)
+        width = self.width
+        tiles = shadowcast(self._opaque, row, col, radius)
+        rows = np.array([tile[0] for tile in tiles], dtype=np.intp)
+        cols = np.array([tile[1] for tile in tiles], dtype=np.intp)
+        values = value - SHADOWCAST_FALLOFF * np.hypot(rows - row, cols - col)
+        values = values.astype(np.int32)
+        lit = values > 0
+        return rows[lit] * width + cols[lit], values[lit]
+
+    def _spread(self, seeds: Dict[int, int], floor: Optional[List[int]]) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """ Propagate the lights seeded at the given flat indices in a single
+        pass and return the flat indices reached with their brightness. A
+        bucket queue hands out tiles from the brightest down so every tile is
+        expanded once. Tiles are not reached if their brightness in floor is
+        as high.
+
+        >>> light_map = LightMap(3, 1)
+        >>> light_map.set_resistance(0, 1, 200)
+        >>> indices, values = light_map._spread({0: 30, 1: 250}, None)
+        >>> sorted(zip(indices.tolist(), values.tolist()))
+        [(0, 50), (1, 250), (2, 50)]
+        >>> indices, values = light_map._spread({0: 30}, [40, 0, 0])
+        >>> len(indices)
+        0
+        """
+        if self._resistance_list is None:
+            self._resistance_list = self._resistance.reshape(-1).tolist()
+        resistance = self._resistance_list
+        width = self.width
+        size = width * self.height
+        brightness = {}
+        top = 0
+        for index in seeds:
+            value = min(seeds[index], MAX_BRIGHTNESS)
+            if floor is None or value > floor[index]:
+                brightness[index] = value
+                top = max(top, value)
+        buckets = [[] for _ in range(top + 1)]
+        for index in brightness:
+            buckets[brightness[index]].append(index)
+        for value in range(top, 0, -1):
+            bucket = buckets[value]
+            while len(bucket) > 0:
+                index = bucket.pop()
+                if not brightness[index] == value:
+                    continue
+                out = value - resistance[index]
+                if out <= 0:
+                    continue
+                col = index % width
+                for n in (index - width, index - 1 if col > 0 else -1,
+                          index + 1 if col < width - 1 else -1,
+                          index + width):
+                    if 0 <= n < size and out > brightness.get(n, 0) and \
+                            (floor is None or out > floor[n]):
+                        brightness[n] = out
+                        buckets[out].append(n)
+        indices = np.fromiter(brightness.keys(), dtype=np.intp,
+                              count=len(brightness))
+        values = np.fromiter(brightness.values(), dtype=np.int32,
+                             count=len(brightness))
+        return indices, values
+
+
+def _tint(values: np.ndarray, color: Color) -> np.ndarray:
+    """ Return the channels of the given light values in the colour
+
+    >>> _tint(np.array([256, 100]), (255, 128, 0)).tolist()
+    [[256, 128, 0], [100, 50, 0]]
+    """
+    return (values[:, None] * np.array(color, dtype=np.int32) // 255).astype(
+        np.int32)
+
+
+def _shadowcast_radius(value: int) -> int:
+    """ Return the number of tiles scanned around a light of the given value
+    in shadowcast mode
+
+    >>> _shadowcast_radius(240)
+    5
+    """
+    return math.ceil(min(value, MAX_BRIGHTNESS) / SHADOWCAST_FALLOFF) - 1
+
+
+def _distance(tile: Tile, focus: Optional[TileRect]) -> int:
+    """ Return the manhattan distance from the tile to the closest tile of
+    the focus, 0 if there is no focus
+
+    >>> _distance((0, 5), (1, 1, 2, 2))
+    4
+    """
+    if focus is None:
+        return 0
+    return max(focus[0] - tile[0], tile[0] - focus[2], 0) + \
+        max(focus[1] - tile[1], tile[1] - focus[3], 0)
+
+
+def shadowcast(opaque: np.ndarray, row: int, col: int,
+               radius: int) -> Set[Tile]:
+    """ Return the tiles within radius rows or columns of the tile at
+    (row, col) that can be seen from it, using recursive symmetric
+    shadowcasting. Opaque tiles are seen but stop sight, tiles outside of
+    the grid are opaque and never seen.
+
+    >>> opaque = np.zeros((5, 5), dtype=bool)
+    >>> opaque[0, 2] = opaque[1, 2] = opaque[3, 2] = True
+    >>> seen = shadowcast(opaque, 2, 0, 4)
+    >>> sorted(tile for tile in seen if tile[1] >= 2)
+    [(0, 2), (1, 2), (1, 4), (2, 2), (2, 3), (2, 4), (3, 2), (3, 4), (4, 2)]
+    """
+    height, width = opaque.shape
+    grid = opaque.tolist()
+    seen = {(row, col)}
+    # each quadrant maps (depth, offset) to a tile, slopes are kept as
+    # (numerator, denominator) pairs with positive denominators
+    for transform in ((lambda d, o: (row - d, col + o)),
+                      (lambda d, o: (row + o, col + d)),
+                      (lambda d, o: (row + d, col + o)),
+                      (lambda d, o: (row + o, col - d))):
+
+        def scan(depth: int, start: Tuple[int, int],
+                 end: Tuple[int, int]) -> None:
+            if depth > radius:
+                return
+            # round the ends of the row half way to the centre of the tiles
+            low = (2 * depth * start[0] + start[1]) // (2 * start[1])
+            high = -((end[1] - 2 * depth * end[0]) // (2 * end[1]))
+            previous = None
+            for offset in range(low, high + 1):
+                r, c = transform(depth, offset)
+                inside = 0 <= r < height and 0 <= c < width
+                wall = not inside or grid[r][c]
+                if inside and (wall or (depth * start[0] <= offset * start[1]
+                                        and offset * end[1] <= depth * end[0])):
+                    seen.add((r, c))
+                if previous is True and not wall:
+                    start = (2 * offset - 1, 2 * depth)
+                if previous is False and wall:
+                    scan(depth + 1, start, (2 * offset - 1, 2 * depth))
+                previous = wall
+            if previous is False:
+                scan(depth + 1, start, end)
+
+        scan(1, (-1, 1), (1, 1))
+    return seen
+
+
+class LightStamp:
+    """
+    Description: Precomputed light of a dynamic source over tiles of uniform
+    light resistance. A tile at manhattan distance d from the source gets
+    value - resistance * d, which is exactly what the flood fill gives when
+    every tile the light reaches has the same resistance. Stamps are shared
+    by all sources of the same value on the same resistance, and are only
+    used where the resistance around the source is uniform.
+
+    === Public Attributes ===
+    - stamps: Cached stamps, accessed by (value, resistance)
+    - resistance: The light resistance of the tiles the stamp is made for
+    - radius: The furthest distance reached by the light
+    - values: Brightness of the tiles around the source, indexed by
+        [radius + row offset, radius + col offset]
+
+    === Representation Invariants ===
+    - radius >= 0
+    """
+    stamps = {}  # dict[Tuple[int, int], LightStamp]
+    resistance: int
+    radius: int
+    values: np.ndarray
+
+    def __init__(self, value: int, resistance: int) -> None:
+        value = min(value, MAX_BRIGHTNESS)
+        self.resistance = resistance
+        self.radius = max(math.ceil(value / resistance) - 1, 0)
+        size = 2 * self.radius + 1
+        rows, cols = np.indices((size, size)) - self.radius
+        distance = np.abs(rows) + np.abs(cols)
+        self.values = np.maximum(value - resistance * distance, 0).astype(
+            np.int32)
+
+    @staticmethod
+    def get(value: int, resistance: int) -> Optional[LightStamp]:
+        """ Return the stamp of the given light value on tiles of the given
+        resistance, or None if the light would never fade
+        """
+        if value <= 0 or resistance <= 0:
+            return None
+        key = (min(value, MAX_BRIGHTNESS), int(resistance))
+        if key not in LightStamp.stamps:
+            LightStamp.stamps[key] = LightStamp(key[0], key[1])
+        return LightStamp.stamps[key]
+
+    def _window(self, shape: Tuple[int, int], row: int, col: int) \
+            -> Tuple[int, int, int, int]:
+        """ Return the rows and columns [r0, r1) x [c0, c1) of a grid of the
+        given shape covered by this stamp centred on the tile
+        """
+        return max(row - self.radius, 0), min(row + self.radius + 1, shape[0]), \
+            max(col - self.radius, 0), min(col + self.radius + 1, shape[1])
+
+    def fits(self, resistance: np.ndarray, row: int, col: int) -> bool:
+        """ Return whether every tile covered by this stamp centred on the tile
+        has the resistance of the stamp
+
+        >>> resistance = np.full((3, 4), 40, dtype=np.int32)
+        >>> LightStamp.get(100, 40).fits(resistance, 1, 0)
+        True
+        >>> resistance[1, 1] = 256
+        >>> LightStamp.get(100, 40).fits(resistance, 1, 0)
+        False
+        """
+        r0, r1, c0, c1 = self._window(resistance.shape, row, col)
+        return bool((resistance[r0:r1, c0:c1] == self.resistance).all())
+
+    def apply(self, brightness: np.ndarray, row: int, col: int,
+              color: Color = DEFAULT_LIGHT_COLOR) -> None:
+        """ Raise the channels of the brightness grid to the light of this
+        stamp in the colour centred on the tile
+
+        >>> brightness = np.zeros((3, 4, 3), dtype=np.int32)
+        >>> LightStamp.get(100, 40).apply(brightness, 1, 0)
+        >>> brightness[..., 0].tolist()
+        [[60, 20, 0, 0], [100, 60, 20, 0], [60, 20, 0, 0]]
+        """
+        r0, r1, c0, c1 = self._window(brightness.shape[:2], row, col)
+        top = row - self.radius
+        left = col - self.radius
+        light = self.values[r0 - top:r1 - top, c0 - left:c1 - left]
+        light = _tint(light.reshape(-1), color).reshape(r1 - r0, c1 - c0, 3)
+        window = brightness[r0:r1, c0:c1]
+        np.maximum(window, light, out=window)
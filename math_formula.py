@@ -19,8 +19,6 @@ def segment_intersection(l1: Tuple[Tuple[float, float], Tuple[float, float]],
     # Calculate slopes and obtain line formula
     i1 = calculate_slope_constant(l1[0], l1[1])
     i2 = calculate_slope_constant(l2[0], l2[1])
-    print("Lines:", l1, l2)
-    print("Slopes:", i1, i2)
     if i1 is None:
         if i2 is None:
             if l1[0][0] == l2[0][0]:
@@ -37,14 +35,12 @@ def segment_intersection(l1: Tuple[Tuple[float, float], Tuple[float, float]],
             return None
         x = l1[0][0]
         y = i2[0] * x + i2[1]
-        print("Attempting 2", x, y)
         if point_on_segment(l1, (x, y)) and point_on_segment(l2, (x, y)):
             return x, y
         return None
     if i2 is None:
         x = l2[0][0]
         y = i1[0] * x + i1[1]
-        print("Attempting 3", x, y)
         if point_on_segment(l1, (x, y)) and point_on_segment(l2, (x, y)):
             return x, y
         return None
@@ -63,7 +59,6 @@ def segment_intersection(l1: Tuple[Tuple[float, float], Tuple[float, float]],
         return returning[0], returning[1]
     x = (i2[1] - i1[1]) / (i1[0] - i2[0])
     y = i1[0] * x + i1[1]
-    print("Attempting 4", x, y)
     if point_on_segment(l1, (x, y)) and point_on_segment(l2, (x, y)):
         return x, y
     return None
@@ -250,3 +245,94 @@ def point_vec_right(
     if p1[0] < p2[0]:
         return y_on_line > point[1]
     return y_on_line < point[1]
+
+
+def ray_box_interval(start: Tuple[float, float], delta: Tuple[float, float],
+                     low: Tuple[float, float], high: Tuple[float, float]
+                     ) -> Optional[Tuple[float, float]]:
+    """ Return the interval (t_enter, t_exit) of parameters during which the
+    point start + t * delta stays inside the half-open box low <= p < high.
+    Return None if the point never enters the box.
+
+    >>> ray_box_interval((0, 0), (10, 0), (5, -1), (8, 1))
+    (0.5, 0.8)
+    >>> ray_box_interval((0, 0), (10, 0), (5, 1), (8, 2)) is None
+    True
+    >>> ray_box_interval((6, 0), (0, 0), (5, -1), (8, 1))
+    (-inf, inf)
+    """
+    t_enter = -math.inf
+    t_exit = math.inf
+    for i in range(2):
+        if delta[i] == 0:
+            if not low[i] <= start[i] < high[i]:
+                return None
+            continue
+        t1 = (low[i] - start[i]) / delta[i]
+        t2 = (high[i] - start[i]) / delta[i]
+        if t1 > t2:
+            t1, t2 = t2, t1
+        t_enter = max(t_enter, t1)
+        t_exit = min(t_exit, t2)
+    if t_enter >= t_exit:
+        return None
+    return t_enter, t_exit
+
+
+def ray_circle_impact(start: Tuple[float, float], delta: Tuple[float, float],
+                      centre: Tuple[float, float], radius: float
+                      ) -> Optional[float]:
+    """ Return the smallest t in [0, 1] at which the point start + t * delta
+    is strictly closer than radius to the centre, None if there's none.
+
+    >>> ray_circle_impact((0, 0), (10, 0), (8, 0), 3)
+    0.5
+    >>> ray_circle_impact((0, 0), (10, 0), (8, 5), 3) is None
+    True
+    >>> ray_circle_impact((7, 0), (10, 0), (8, 0), 3)
+    0
+    """
+    ox = start[0] - centre[0]
+    oy = start[1] - centre[1]
+    c = ox * ox + oy * oy - radius * radius
+    if c < 0:
+        return 0
+    a = delta[0] * delta[0] + delta[1] * delta[1]
+    if a == 0:
+        return None
+    b = 2 * (delta[0] * ox + delta[1] * oy)
+    disc = b * b - 4 * a * c
+    if disc <= 0:
+        return None
+    t = (-b - math.sqrt(disc)) / (2 * a)
+    if 0 <= t <= 1:
+        return t
+    return None
+
+
+def ray_rounded_box_impact(start: Tuple[float, float],
+                           delta: Tuple[float, float],
+                           low: Tuple[float, float], high: Tuple[float, float],
+                           radius: float) -> Optional[float]:
+    """ Return the smallest t in [0, 1] at which the point start + t * delta
+    is within radius of the box spanning low to high, None if there's none.
+
+    >>> ray_rounded_box_impact((0, 0), (10, 0), (6, -2), (8, 2), 1)
+    0.5
+    >>> ray_rounded_box_impact((0, 4), (10, 0), (6, -2), (8, 2), 1) is None
+    True
+    """
+    best = None
+    slabs = [((low[0] - radius, low[1]), (high[0] + radius, high[1])),
+             ((low[0], low[1] - radius), (high[0], high[1] + radius))]
+    for lo, hi in slabs:
+        interval = ray_box_interval(start, delta, lo, hi)
+        if interval is not None and interval[0] <= 1 and interval[1] > 0:
+            t = max(interval[0], 0)
+            if best is None or t < best:
+                best = t
+    for corner in [low, (low[0], high[1]), (high[0], low[1]), high]:
+        t = ray_circle_impact(start, delta, corner, radius)
+        if t is not None and (best is None or t < best):
+            best = t
+    return best
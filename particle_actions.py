@@ -28,12 +28,14 @@ class Illuminator(Lightable, ActiveParticle):
         self.add_action(il)
 
     def _illuminate(self):
-        tiles = self.get_tiles_in_contact()
+        rect = self.get_tile_rect()
+        if rect is None:
+            return
+        light_map = public_namespace.light_map[self.map_name]
         sl = self.get_stat('light_source')
-        for tile in tiles:
-            ol = tile.get_stat('light_source')
-            if ol < sl:
-                tile.add_stats({'light_source': sl - ol})
+        for row in range(rect[0], rect[2] + 1):
+            for col in range(rect[1], rect[3] + 1):
+                light_map.add_light(row, col, sl, self.light_color)
 
 
 class Puppet(Illuminator):
@@ -104,6 +106,7 @@ class StandardMoveSet(CombatStats, Manaized, DisplacableParticle,
     - action_animation: The animation of actions
     - animations: Animations for actions
     - speed: Speed of the particle
+    - show_attack_animation: Whether basic attacks spawn a visual puppet
 
     === Private Attributes ===
     - _attack_counter: The counter for basic attack cooldown
@@ -114,14 +117,17 @@ class StandardMoveSet(CombatStats, Manaized, DisplacableParticle,
     target: MultiObjectsEvaluator
     animations: dict[str, Puppet]
     speed: float
+    show_attack_animation: bool
 
     def __init__(self, info: dict[str, Any]) -> None:
-        attr = ['attack_speed', 'attack_range', 'target', 'speed']
+        attr = ['attack_speed', 'attack_range', 'target', 'speed',
+                'show_attack_animation']
         default = {
             'attack_speed': DEFAULT_ATTACK_SPEED,
             'attack_range': DEFAULT_ATTACK_RANGE,
             'target': MultiObjectsEvaluator(DEFAULT_TARGET),
-            'speed': DEFAULT_SPEED
+            'speed': DEFAULT_SPEED,
+            'show_attack_animation': True
         }
         for key in default:
             if key not in info:
@@ -207,28 +213,24 @@ class StandardMoveSet(CombatStats, Manaized, DisplacableParticle,
         offset = diameter / 2 - attack_range
         cx = self.x + offset
         cy = self.y + offset
-        info = {
-            'diameter': attack_range * 2,
-            'shape': self.shape,
-            'texture': self.actions['basic_attack'].action_texture,
-            'owner': self,
-            'light_source': BASIC_ATTACK_BRIGHTNESS,
-            'x': cx,
-            'y': cy,
-            'solid': False,
-            'map_name': self.map_name,
-            'sync_offset': (offset, offset),
-            'update_priority': BASIC_ATTACK_ANIMATION_PRIORITY
-        }
-        collision_box = Puppet(info)
-        self.animations["basic_attack"] = collision_box
-        living = list(filter(lambda c: isinstance(Particle.particle_group[c],
-                                                  Living),
-                             get_nearby_particles(collision_box)))
-        for entity in living:
-            entity = Particle.particle_group[entity]
-            if self.is_target(entity) and \
-                    collision_box.detect_collision(entity):
+        if self.show_attack_animation:
+            info = {
+                'diameter': attack_range * 2,
+                'shape': self.shape,
+                'texture': self.actions['basic_attack'].action_texture,
+                'owner': self,
+                'light_source': BASIC_ATTACK_BRIGHTNESS,
+                'x': cx,
+                'y': cy,
+                'solid': False,
+                'map_name': self.map_name,
+                'sync_offset': (offset, offset),
+                'update_priority': BASIC_ATTACK_ANIMATION_PRIORITY
+            }
+            self.animations["basic_attack"] = Puppet(info)
+        for entity in query_shape(self.map_name, self.shape, cx, cy,
+                                  attack_range * 2):
+            if self.is_target(entity):
                 entity.register_damage(self.get_stat('attack_power'))
         self._attack_counter = 0
         return True
@@ -338,40 +340,26 @@ class Fireball(StandardMoveSet, Illuminator):
             self.destroyed = True
         super().update_status()
 
-    def direction_increment(self, time: int, direction: str, total: float,
-                            current: int) -> Tuple[float, float]:
-        """ Increment the position of the particle in given direction """
-        vel = 'v' + direction
+    def displace(self, dx: float, dy: float) -> None:
         if self.destroyed:
-            setattr(self, "v" + direction, 0)
-            return 0, current
-        for i in range(time):
-            if total > 0:
-                if total >= 1:
-                    value = self.get_stat(vel) / abs(self.get_stat(vel))
-                    total -= 1
-                else:
-                    value = self.get_stat(vel) - int(self.get_stat(vel))
-                    total = 0
-                setattr(self, direction, getattr(self, direction) + value)
-                self.update_map_position()
-                n = int(getattr(self, direction))
-                if abs(n - current) >= 1:
-                    ps = get_particles_by_tiles(
-                        self.map_name,
-                        colliding_tiles_generator(self.x, self.y,
-                                                  self.diameter))
-                    for particle in ps:
-                        particle = Particle.particle_group[particle]
-                        if not self.ignore.eval(particle) and \
-                                (self.is_target(particle) or particle.solid) \
-                                and self.detect_collision(particle):
-                            self.destroyed = True
-                            if isinstance(particle, Fireball):
-                                particle.destroyed = True
-                            setattr(self, "v" + direction, 0)
-                            return 0, current
-        return total, current
+            self.vx = 0
+            self.vy = 0
+            return
+        super().displace(dx, dy)
+
+    def blocks(self, particle: Particle) -> bool:
+        return not self.ignore.eval(particle) and \
+            (self.is_target(particle) or particle.solid)
+
+    def upon_collision(self, particle: Particle, blocked_x: bool,
+                       blocked_y: bool) -> bool:
+        """ Explode on contact with the particle """
+        self.destroyed = True
+        if isinstance(particle, Fireball):
+            particle.destroyed = True
+        self.vx = 0
+        self.vy = 0
+        return False
 
     def is_target(self, particle: Particle) -> bool:
         contract = {
@@ -444,6 +432,7 @@ class ProjectileThrowable(CombatStats, Manaized, ActiveParticle):
             'shape': self.shape,
             'ignore': ObjectAttributeEvaluator(condition),
             'light_source': FIREBALL_BRIGHTNESS,
+            'light_color': FIREBALL_LIGHT_COLOR,
             'texture': self.actions['fireball'].action_texture,
             'target': self.target,
             'attack_damage': self.get_stat('ability_power'),
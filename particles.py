@@ -1,12 +1,17 @@
 from __future__ import annotations
 import pygame
 import math
+import bisect
 import public_namespace
-from typing import List, Tuple, Union, Set, Any
+from typing import List, Tuple, Union, Set, Any, Optional, Callable
 from utilities import Positional, Displacable, Collidable, Lightable, Living, \
+    collidable_arrays, shape_collisions, \
     Directional, get_direction, Staminaized, Interactive, Animated, UpdateReq
 from settings import *
-from data_structures import Queue
+from expression_trees import MultiObjectsEvaluator
+from spatial_index import TileRect, tile_rect, swept_tile_rect, \
+    rect_difference, pixel_bounds, neighbourhood_mask, traverse_tiles
+from broad_phase import BroadPhase
 from item import *
 
 
@@ -24,6 +29,14 @@ class Particle(Collidable, Directional):
     - texture: The texture of this particle
 
     === Private Attributes ===
+    - _occupation: Name of the map whose spatial index this particle is
+        registered in, None if it's not registered
+    - _tile_rect: The rectangle of tiles this particle occupies in the map
+        of _occupation
+    - _tile_bounds: The range of integer positions (min_x, min_y, max_x,
+        max_y) and the diameter for which _tile_rect stays the same
+    - _indexed_types: Types in INDEXED_TYPES this particle is an instance of,
+        the particle is also registered in the sub-index of each of them
 
     """
     # static fields
@@ -38,7 +51,10 @@ class Particle(Collidable, Directional):
     texture: str
     map_display: str
     name: str
-    _occupation: dict[str, Set[Tuple[int, int]]]
+    _occupation: Optional[str]
+    _tile_rect: Optional[TileRect]
+    _tile_bounds: Optional[Tuple[int, int, int, int, int]]
+    _indexed_types: List[type]
 
     def __init__(self, info: dict[str, Union[str, float, int]]) -> None:
         default = {
@@ -56,7 +72,11 @@ class Particle(Collidable, Directional):
                 info[key] = default[key]
         for item in attr:
             setattr(self, item, info[item])
-        self._occupation = {self.map_name: set()}
+        self._occupation = None
+        self._tile_rect = None
+        self._tile_bounds = None
+        self._indexed_types = [tp for tp in INDEXED_TYPES
+                               if isinstance(self, tp)]
         self.update_map_position()
         Particle.particle_group[self.id] = self
         Particle.new_particles[self.id] = self
@@ -71,6 +91,13 @@ class Particle(Collidable, Directional):
 
     def display(self, screen: pygame.Surface,
                 location: Tuple[int, int]) -> None:
+        screen.blit(*self.get_blit(location))
+
+    def get_blit(self, location: Tuple[float, float]) \
+            -> Tuple[pygame.Surface, Tuple[float, float]]:
+        """ Return the texture of this particle and the position to blit it
+        at when its top left corner is displayed at location
+        """
         radius = self.diameter / 2 * public_namespace.scale
         texture = self.get_texture()
         centre_x = location[0] + radius - 1
@@ -78,44 +105,103 @@ class Particle(Collidable, Directional):
         size = texture.get_size()
         cx = centre_x - int(size[0] / 2) + 1
         cy = centre_y - int(size[1] / 2) + 1
-        screen.blit(texture, [cx, cy])
+        return texture, (cx, cy)
 
-    def get_texture(self):
+    def get_texture(self, direction: Optional[float] = None):
+        """ Return the texture of this particle at the current camera scale,
+        rotated to direction or to the direction of this particle
+        """
+        if direction is None:
+            direction = self.direction
         d = math.ceil(self.get_stat("diameter") * public_namespace.scale)
         return public_namespace.get_texture_by_info(self.texture, (d, d),
-                                                    self.direction, 255)
+                                                    direction, 255)
+
+    def prerender_rotation(self, step: int) -> None:
+        """ Render the texture of this particle at the rotation step and the
+        current camera scale bucket
+        """
+        self.get_texture(step * 360 / ROTATION_STEPS)
 
     def remove(self):
         """ Remove this particle from the game """
         Particle.particle_group.pop(self.id, None)
-        for cod in self._occupation[self.map_name]:
-            public_namespace.game_map[self.map_name][cod[0]][cod[1]].remove(
-                self.id)
+        if self._occupation is not None:
+            self._unregister()
+            self._leave_tiles(self._tile_rect, None)
+            self._occupation = None
+            self._tile_rect = None
+            self._tile_bounds = None
 
     def update_map_position(self):
-        """ Update the position of the particle on the game map """
-        occupied = self._occupation.copy()
-        new_pos = calculate_colliding_tiles(int(self.x), int(self.y),
-                                            self.get_stat('diameter'))
-        for mp in occupied:
-            for point in occupied[mp].copy():
-                if not mp == self.map_name or point not in new_pos:
-                    self._occupation[mp].remove(point)
-                    public_namespace.game_map[mp][point[0]][point[1]].remove(
-                        self.id)
-                else:
-                    new_pos.remove(point)
-        for point in new_pos:
-            if self.map_name not in self._occupation:
-                self._occupation[self.map_name] = set()
-            self._occupation[self.map_name].add(point)
-            public_namespace.game_map[self.map_name][point[0]][point[1]].add(
-                self.id)
+        """ Update the position of the particle on the game map, nothing is
+        done unless the particle has moved onto a different set of tiles.
+        """
+        x = int(self.x)
+        y = int(self.y)
+        diameter = self.get_stat('diameter')
+        bounds = self._tile_bounds
+        if bounds is not None and self._occupation == self.map_name and \
+                bounds[4] == diameter and bounds[0] <= x <= bounds[2] and \
+                bounds[1] <= y <= bounds[3]:
+            return
+        rect = tile_rect(x, y, diameter)
+        self._tile_bounds = pixel_bounds(rect, diameter) + (diameter,)
+        old = self._tile_rect
+        if not self._occupation == self.map_name:
+            if self._occupation is not None:
+                self._unregister()
+                self._leave_tiles(old, None)
+            self._occupation = self.map_name
+            old = None
+        elif old == rect:
+            return
+        self._tile_rect = rect
+        public_namespace.game_map[self.map_name].move(self.id, rect)
+        sub_indexes = public_namespace.typed_map[self.map_name]
+        for tp in self._indexed_types:
+            sub_indexes[tp].move(self.id, rect)
+        self._leave_tiles(old, rect)
+        for row, col in rect_difference(rect, old):
+            self.enter_tile(row, col)
+
+    def _unregister(self) -> None:
+        """ Remove this particle from the indexes of the map it occupies """
+        public_namespace.game_map[self._occupation].remove(self.id)
+        sub_indexes = public_namespace.typed_map[self._occupation]
+        for tp in self._indexed_types:
+            sub_indexes[tp].remove(self.id)
+
+    def _leave_tiles(self, rect: Optional[TileRect],
+                     new: Optional[TileRect]) -> None:
+        """ Call leave_tile on tiles of rect that are not in the new rect """
+        for row, col in rect_difference(rect, new):
+            self.leave_tile(row, col)
+
+    def enter_tile(self, row: int, col: int) -> None:
+        """ Called when this particle starts to occupy the tile at (row, col)
+        of its map
+        """
+        pass
+
+    def leave_tile(self, row: int, col: int) -> None:
+        """ Called when this particle stops occupying the tile at (row, col)
+        of the map it was in
+        """
+        pass
+
+    def get_tile_rect(self) -> Optional[TileRect]:
+        """ Return the rectangle of tiles this particle occupies """
+        return self._tile_rect
 
     def get_tiles_in_contact(self) -> List[Block]:
-        for t in self._occupation[self.map_name]:
-            tile = public_namespace.tile_map[self.map_name][t[0]][t[1]]
-            yield Particle.particle_group[tile]
+        rect = self.get_tile_rect()
+        if rect is None:
+            return
+        tiles = public_namespace.tile_map[self.map_name]
+        for row in range(rect[0], rect[2] + 1):
+            for col in range(rect[1], rect[3] + 1):
+                yield Particle.particle_group[tiles[row][col]]
 
     def __str__(self):
         return self.name
@@ -156,75 +242,239 @@ class AnimatedParticle(Animated, Particle):
 
 
 class DisplacableParticle(Displacable, Particle):
-    """ Particles that can change its position """
-
-    def calculate_order(self) -> Tuple[float, float, int, int, int, int]:
-        x_d = abs(self.get_stat('vx'))
-        y_d = abs(self.get_stat('vy'))
-        c_x = int(self.x)
-        c_y = int(self.y)
-        if self.get_stat('vx') == 0 and self.get_stat('vy') == 0:
-            return 0, 0, 0, 0, 0, 0
-        if self.get_stat('vx') == 0:
-            x_time = 0
-            y_time = 1
-        elif self.get_stat('vy') == 0:
-            x_time = 1
-            y_time = 0
-        elif abs(self.get_stat('vx')) > abs(self.get_stat('vy')):
-            x_time = int(round(abs(self.get_stat('vx')) / abs(self.get_stat(
-                'vy')), 0))
-            y_time = 1
-        elif abs(self.get_stat('vx')) < abs(self.get_stat('vy')):
-            x_time = 1
-            y_time = int(round(abs(self.get_stat('vy')) / abs(self.get_stat(
-                'vx')), 0))
-        else:
-            x_time, y_time = 1, 1
-        return x_d, y_d, c_x, c_y, x_time, y_time
-
-    def direction_increment(self, time: int, direction: str, total: float,
-                            current: int) \
-            -> Tuple[float, float]:
-        """ Change the position of the particle towards the given direction """
-        vel = self.get_stat('v' + direction)
-
-        for i in range(time):
-            if total > 0:
-                if total >= 1:
-                    value = vel / abs(vel)
-                    total -= 1
+    """ Particles that can change its position
+
+    === Public Attributes ===
+    - broad_phase: Candidate pairs of all particles moving during the current
+        frame
+    """
+    broad_phase = BroadPhase()
+
+    def displace(self, dx: float, dy: float) -> None:
+        """ Move the particle by (dx, dy) in a single sweep. The particle
+        stops right before the first particle blocking its way, the velocity
+        along each blocked axis is set to 0 and the rest of the displacement
+        continues along the other axis. Walls are looked up in the solid tile
+        bitmap of the map and resolved against their tile squares first, the
+        earliest wall contact bounds the narrow phase of the other particles.
+        """
+        walls, candidates = self._get_obstacles(dx, dy)
+        while not (dx == 0 and dy == 0):
+            toi, tile = self._wall_contact_time(walls, dx, dy)
+            hit = None if tile is None else walls[tile]
+            for particle in candidates:
+                t = self.time_of_impact(particle, dx, dy)
+                if t is not None and (toi is None or t < toi):
+                    t = self._contact_time(
+                        lambda: self.detect_collision(particle), dx, dy, t)
+                    if t is not None and (toi is None or t < toi):
+                        hit = particle
+                        toi = t
+            if hit is None:
+                self.x += dx
+                self.y += dy
+                break
+            start_x = self.x
+            start_y = self.y
+            self._stop_before(candidates, walls, dx, dy, toi)
+            blocked_x = not dx == 0 and self._collides_at(
+                candidates, walls, math.copysign(1, dx), 0)
+            blocked_y = not dy == 0 and self._collides_at(
+                candidates, walls, 0, math.copysign(1, dy))
+            if not blocked_x and not blocked_y:
+                # Only the diagonal step collides
+                if abs(dx) >= abs(dy):
+                    blocked_x = True
                 else:
-                    value = vel - int(vel)
-                    total = 0
-                setattr(self, direction, getattr(self, direction) + value)
-                self.update_map_position()
-                n = int(getattr(self, direction))
-                if abs(n - current) >= 1:
-                    particles = get_particles_by_tiles(
-                        self.map_name,
-                        colliding_tiles_generator(self.x, self.y,
-                                                  self.diameter))
-                    for particle in particles:
-                        particle = Particle.particle_group[particle]
-                        if not particle.id == self.id and particle.solid and \
-                                self.solid \
-                                and self.detect_collision(particle):
-                            setattr(self, direction, getattr(self, direction) -
-                                    value)
-                            self.update_map_position()
-                            setattr(self, "v" + direction, 0)
-                            return 0, current
-        return total, current
+                    blocked_y = True
+            if not self.upon_collision(hit, blocked_x, blocked_y):
+                break
+            dx = 0 if blocked_x else start_x + dx - self.x
+            dy = 0 if blocked_y else start_y + dy - self.y
+        self.update_map_position()
+
+    def _get_obstacles(self, dx: float, dy: float) \
+            -> Tuple[dict[Tuple[int, int], Block], List[Particle]]:
+        """ Return the wall tiles and the other particles blocking the
+        particle while it moves by (dx, dy). Walls are keyed by their
+        (row, col) on the map.
+        """
+        rect = swept_tile_rect(self.x, self.y, dx, dy, self.diameter)
+        tiles = public_namespace.tile_map[self.map_name]
+        walls = {}
+        wall_ids = set()
+        for row, col in public_namespace.solid_map[self.map_name].query_rect(
+                rect):
+            block = Particle.particle_group[tiles[row][col]]
+            wall_ids.add(block.id)
+            if self.blocks(block):
+                walls[(row, col)] = block
+        candidates = []
+        for p in self.get_collision_candidates(dx, dy):
+            if p not in wall_ids and not p == self.id:
+                particle = Particle.particle_group[p]
+                if self.blocks(particle):
+                    candidates.append(particle)
+        return walls, candidates
+
+    def get_collision_candidates(self, dx: float, dy: float) -> Set[int]:
+        """ Return ids of particles this particle may run into while moving
+        by (dx, dy). Other moving particles are taken from the candidate pairs
+        of the broad phase when this particle took part in it.
+        """
+        rect = swept_tile_rect(self.x, self.y, dx, dy, self.diameter)
+        ids = public_namespace.game_map[self.map_name].query_rect(rect)
+        phase = DisplacableParticle.broad_phase
+        if self.id not in phase:
+            return ids
+        returning = set()
+        for p in ids:
+            if p not in phase:
+                returning.add(p)
+        for p in phase.get_partners(self.id):
+            if p in Particle.particle_group:
+                returning.add(p)
+        return returning
+
+    def blocks(self, particle: Particle) -> bool:
+        """ Return whether the particle blocks the movement of this particle
+        """
+        return self.solid and particle.solid
+
+    def upon_collision(self, particle: Particle, blocked_x: bool,
+                       blocked_y: bool) -> bool:
+        """ React to running into the particle, return whether this particle
+        keeps moving along the axis that isn't blocked.
+        """
+        if blocked_x:
+            self.vx = 0
+        if blocked_y:
+            self.vy = 0
+        return True
+
+    def _contact_time(self, collides: Callable[[], bool], dx: float,
+                      dy: float, toi: float) -> Optional[float]:
+        """ Return the fraction of (dx, dy) from the analytic time of impact
+        toi onwards at which collides() holds for this particle, None if it
+        only grazes past. Coordinates are truncated to integers by the
+        collision checks so the contact may come slightly later than toi, it
+        is looked for in the CONTACT_SAMPLES pixels from toi and at the end of
+        the displacement, then narrowed down by CONTACT_BISECTION_STEPS
+        bisection steps from the last free fraction.
+        """
+        start_x = self.x
+        start_y = self.y
+        step = 1 / max(abs(dx), abs(dy), 1)
+        free = None
+        contact = None
+        for i in range(CONTACT_SAMPLES + 1):
+            t = 1 if i == CONTACT_SAMPLES else min(toi + i * step, 1)
+            if free is not None and t <= free:
+                continue
+            self.x = start_x + dx * t
+            self.y = start_y + dy * t
+            if collides():
+                contact = t
+                break
+            free = t
+        if contact is not None and free is not None:
+            for _ in range(CONTACT_BISECTION_STEPS):
+                t = (free + contact) / 2
+                self.x = start_x + dx * t
+                self.y = start_y + dy * t
+                if collides():
+                    contact = t
+                else:
+                    free = t
+        self.x = start_x
+        self.y = start_y
+        return contact
+
+    def _wall_contact_time(self, walls: dict[Tuple[int, int], Block],
+                           dx: float, dy: float) \
+            -> Tuple[Optional[float], Optional[Tuple[int, int]]]:
+        """ Return the first fraction of (dx, dy) at which this particle runs
+        into one of the wall tiles and the tile it runs into. The time of
+        impact against each tile is computed from the tile square, only walls
+        closer than the earliest contact found so far are refined.
+        """
+        contact = (None, None)
+        for row, col in walls:
+            t = self.tile_time_of_impact(row, col, dx, dy)
+            if t is None or (contact[0] is not None and t >= contact[0]):
+                continue
+            t = self._contact_time(
+                lambda: self.collides_with_tile(row, col), dx, dy, t)
+            if t is not None and (contact[0] is None or t < contact[0]):
+                contact = (t, (row, col))
+        return contact
+
+    def _hit_wall(self, walls: dict[Tuple[int, int], Block]) \
+            -> Optional[Tuple[int, int]]:
+        """ Return the first wall tile this particle collides with at its
+        current position, None if there's none.
+        """
+        if self.diameter == 0 or len(walls) == 0:
+            return None
+        rect = tile_rect(int(self.x), int(self.y), self.diameter)
+        for row in range(rect[0], rect[2] + 1):
+            for col in range(rect[1], rect[3] + 1):
+                if (row, col) in walls and self.collides_with_tile(row, col):
+                    return row, col
+        return None
+
+    def _stop_before(self, candidates: List[Particle],
+                     walls: dict[Tuple[int, int], Block], dx: float,
+                     dy: float, toi: float) -> None:
+        """ Place the particle at the furthest position before toi along
+        (dx, dy) that doesn't collide with any of the candidates or walls. The
+        position right before toi is tried first, otherwise it is narrowed
+        down by CONTACT_BISECTION_STEPS bisection steps between the start of
+        the displacement and toi. The particle stays in place if no position
+        is found.
+        """
+        start_x = self.x
+        start_y = self.y
+        self.x = start_x + dx * (toi - 1e-6)
+        self.y = start_y + dy * (toi - 1e-6)
+        if toi > 1e-6 and not self._collides_at(candidates, walls, 0, 0):
+            return
+        free = 0
+        blocked = toi
+        for _ in range(CONTACT_BISECTION_STEPS):
+            t = (free + blocked) / 2
+            self.x = start_x + dx * t
+            self.y = start_y + dy * t
+            if self._collides_at(candidates, walls, 0, 0):
+                blocked = t
+            else:
+                free = t
+        self.x = start_x + dx * free
+        self.y = start_y + dy * free
+
+    def _collides_at(self, candidates: List[Particle],
+                     walls: dict[Tuple[int, int], Block], offset_x: float,
+                     offset_y: float) -> bool:
+        """ Return whether this particle collides with any of the candidates
+        or walls after being offset by the given amount.
+        """
+        self.x += offset_x
+        self.y += offset_y
+        collided = self._hit_wall(walls) is not None
+        if not collided:
+            for particle in candidates:
+                if self.detect_collision(particle):
+                    collided = True
+                    break
+        self.x -= offset_x
+        self.y -= offset_y
+        return collided
 
     def update_status(self):
-        if not (self.get_stat("vx") == 0 and self.get_stat("vy") == 0):
-            x_d, y_d, c_x, c_y, x_time, y_time = self.calculate_order()
-            while x_d > 0 or y_d > 0:
-                x_d, c_x = self.direction_increment(x_time, "x",
-                                                    x_d, c_x)
-                y_d, c_y = self.direction_increment(y_time, "y",
-                                                    y_d, c_y)
+        vx = self.get_stat("vx")
+        vy = self.get_stat("vy")
+        if not (vx == 0 and vy == 0):
+            self.displace(vx, vy)
         super().update_status()
 
 
@@ -283,32 +533,42 @@ class Block(Lightable, Particle):
     def remove(self):
         Particle.remove(self)
         Block.block_group.pop(self.id, None)
+        self.refresh_tile()
+
+    def is_wall(self) -> bool:
+        """ Return whether this block is a solid square filling its tile """
+        return self.solid and self.shape == 'square' and \
+            self.diameter == TILE_SIZE and self.x % TILE_SIZE == 0 and \
+            self.y % TILE_SIZE == 0
 
-    def light(self) -> None:
-        """ Raise brightness of nearby blocks """
-        queue = Queue()
-        called = set()
-        called.add(self.id)
-        value = self.get_stat("light_source") - self.get_stat("brightness")
-        if value > 0:
-            self.add_stats({"brightness": value})
-        for block in get_particles_in_radius(self, 1, Block, False):
-            if block.id not in called:
-                queue.enqueue((self.id, block.id))
-        while not queue.is_empty():
-            item = queue.dequeue()
-            p1 = Block.block_group[item[0]]
-            p2 = Block.block_group[item[1]]
-            value = p1.get_stat("brightness") - p1.get_stat('light_resistance')
-            b2 = p2.get_stat("brightness")
-            l2 = p2.get_stat("light_source")
-            if value > 0 and value > b2 and value > l2:
-                p2.add_stats({"brightness": value - b2})
-                called.add(item[1])
-                tiles = get_particles_in_radius(p2, 1, Block, False)
-                for block in tiles:
-                    if block.id not in called:
-                        queue.enqueue((p2.id, block.id))
+    def refresh_tile(self) -> None:
+        """ Update the solid tile bitmap, the light map and the tile layer of
+        the map if this block is the tile of its position
+        """
+        bitmap = public_namespace.solid_map.get(self.map_name)
+        if bitmap is None:
+            return
+        row = int(self.y // TILE_SIZE)
+        col = int(self.x // TILE_SIZE)
+        tiles = public_namespace.tile_map[self.map_name]
+        if not (0 <= row < len(tiles) and 0 <= col < len(tiles[row]) and
+                tiles[row][col] == self.id):
+            return
+        light_map = public_namespace.light_map[self.map_name]
+        layer = public_namespace.tile_layer.get(self.map_name)
+        if layer is not None:
+            layer.invalidate(row, col)
+        if self.id in Particle.particle_group:
+            bitmap.set(row, col, self.is_wall())
+            light_map.set_resistance(row, col, self.light_resistance)
+            light_map.set_source(row, col, self.light_source,
+                                 self.light_color)
+            light_map.set_opaque(row, col, self.solid)
+        else:
+            bitmap.set(row, col, False)
+            light_map.set_resistance(row, col, 0)
+            light_map.set_source(row, col, 0)
+            light_map.set_opaque(row, col, False)
 
 
 class ActiveParticle(Staminaized, Particle):
@@ -381,7 +641,6 @@ class Creature(Living, Particle):
 
     """
     creature_group = {}
-    creature_textures = {}
     color: Tuple[int, int, int]
     light_on: bool
 
@@ -402,18 +661,20 @@ class Creature(Living, Particle):
         for item in attr:
             setattr(self, item, info[item])
 
-    def get_texture(self):
+    def get_texture(self, direction: Optional[float] = None):
+        if direction is None:
+            direction = self.direction
         d = math.ceil(self.get_stat("diameter") * public_namespace.scale)
         texture = self.texture
-        tup = (texture, (d, d), self.direction, 255, self.color)
-        try:
-            return Creature.creature_textures[tup].copy()
-        except KeyError:
-            raw = public_namespace.get_texture_by_info(texture, (d * 2, d * 2),
-                                                       self.direction, 255)
+        tup = (texture, (d, d), public_namespace.snap_direction(direction),
+               255, self.color)
+        raw = public_namespace.par_images.get(tup)
+        if raw is None:
+            raw = public_namespace.get_writable_texture(
+                texture, (d * 2, d * 2), direction, 255)
             self._draw_color_on_texture(raw)
-            Creature.creature_textures[tup] = raw
-            return raw.copy()
+            public_namespace.par_images.put(tup, raw)
+        return raw
 
     def _draw_color_on_texture(self, surface: pygame.Surface) -> None:
         if self.color is not None:
@@ -432,6 +693,10 @@ class Creature(Living, Particle):
         Creature.creature_group.pop(self.id, None)
 
 
+# Types with a sub-index on every map
+INDEXED_TYPES = (Living, Interactive, ActiveParticle)
+
+
 def calculate_colliding_tiles(x: float, y: float, diameter: int,
                               ) -> List[Tuple[int, int]]:
     """ Return the coordinates of the colliding tiles with the given info """
@@ -461,54 +726,237 @@ def colliding_tiles_generator(x: float, y: float,
 def get_particles_by_tiles(map_name: str,
                            coordinates: List[Tuple[int, int]]) -> Set[int]:
     """ Return particle ids inside tiles given by the coordinates """
-    mp = public_namespace.game_map[map_name]
-    ps = set()
-    for coord in coordinates:
-        ps.update(mp[coord[0]][coord[1]].copy())
-    return ps
+    return public_namespace.game_map[map_name].query_tiles(coordinates)
 
 
 def get_particles_in_radius(particle: Particle, radius=1, tp=None,
                             corner=True) -> List[Particle]:
-    """ Return particles in the given radius through Generator """
+    """ Return particles in the given radius through Generator, types in
+    INDEXED_TYPES are looked up in their own sub-index and blocks are taken
+    from the tile map.
+    """
     x = particle.x + particle.diameter / 2
     y = particle.y + particle.diameter / 2
     row = int(y // TILE_SIZE)
     col = int(x // TILE_SIZE)
-    start_row = row - radius
-    end_row = row + radius
-    start_col = col - radius
-    end_col = col + radius
-
-    width = len(public_namespace.game_map[particle.map_name])
-    height = len(public_namespace.game_map[particle.map_name][0])
-    if start_row < 0:
-        start_row = 0
-    if end_row >= height:
-        end_row = height - 1
-    if start_col < 0:
-        start_col = 0
-    if end_col >= width:
-        end_col = width - 1
+    mask = neighbourhood_mask(radius, corner)
+    if tp == Block:
+        tiles = public_namespace.tile_map[particle.map_name]
+        height = len(tiles)
+        for r, c in mask:
+            r += row
+            c += col
+            if 0 <= r < height and 0 <= c < len(tiles[r]):
+                yield Block.block_group[tiles[r][c]]
+        return
+    if tp in INDEXED_TYPES:
+        index = public_namespace.typed_map[particle.map_name][tp]
+        tp = None
+    else:
+        index = public_namespace.game_map[particle.map_name]
     yielded = set()
-    for x in range(start_row, end_row + 1):
-        dif = abs(x - row)
-        for y in range(start_col, end_col + 1):
-            if not corner and abs(y - col) > (radius - dif):
+    for r, c in mask:
+        for p in index.query_tile(row + r, col + c):
+            if p not in yielded:
+                item = Particle.particle_group[p]
+                if tp is not None and not isinstance(item, tp):
+                    continue
+                yielded.add(p)
+                yield item
+
+
+def nearest(particle: Particle, k=1,
+            condition: Union[type, MultiObjectsEvaluator, None] = None,
+            radius: Optional[int] = None) -> List[Particle]:
+    """ Return up to k particles closest to the given particle on its map,
+    sorted by the distance between their centres. The condition is either a
+    type or a MultiObjectsEvaluator evaluated on the particle (self) and the
+    candidate (other). Tiles are searched ring by ring outwards, up to radius
+    rings if given, and the search stops once no unvisited particle can be
+    closer than the k-th best one.
+
+    >>> import random
+    >>> from spatial_index import SpatialIndex
+    >>> public_namespace.game_map['nearest'] = SpatialIndex(12, 12)
+    >>> public_namespace.typed_map['nearest'] = {
+    ...     tp: SpatialIndex(12, 12) for tp in INDEXED_TYPES}
+    >>> rng = random.Random(7)
+    >>> def place(x, y):
+    ...     return Particle({'x': x, 'y': y, 'map_name': 'nearest',
+    ...                      'diameter': rng.choice([10, 30, 90])})
+    >>> def edge():
+    ...     return rng.randrange(1, 12) * TILE_SIZE - rng.choice([5, 15, 45])
+    >>> ps = [place(rng.uniform(0, 1100), rng.uniform(0, 1100))
+    ...       for _ in range(50)] + [place(edge(), edge()) for _ in range(30)]
+    >>> def distance(a, b):
+    ...     return math.hypot(a.x + a.diameter / 2 - b.x - b.diameter / 2,
+    ...                       a.y + a.diameter / 2 - b.y - b.diameter / 2)
+    >>> mismatch = 0
+    >>> for p in ps:
+    ...     brute = sorted(distance(p, o) for o in
+    ...                    get_particles_in_radius(p, 12) if o is not p)
+    ...     for k in (1, 3, 7):
+    ...         found = [distance(p, o) for o in nearest(p, k)]
+    ...         mismatch += found != brute[:k]
+    >>> mismatch
+    0
+    >>> for p in ps:
+    ...     p.remove()
+    """
+    if k <= 0:
+        return []
+    x = particle.x + particle.diameter / 2
+    y = particle.y + particle.diameter / 2
+    row = int(y // TILE_SIZE)
+    col = int(x // TILE_SIZE)
+    tp = None
+    evaluator = None
+    if isinstance(condition, MultiObjectsEvaluator):
+        evaluator = condition
+        prefixes = evaluator.get_attrs()
+        contract = {}
+        if SELF_PREFIX in prefixes:
+            contract[SELF_PREFIX] = particle
+    else:
+        tp = condition
+    if tp in INDEXED_TYPES:
+        index = public_namespace.typed_map[particle.map_name][tp]
+        tp = None
+    else:
+        index = public_namespace.game_map[particle.map_name]
+    if radius is None:
+        radius = max(index.width, index.height)
+    # distance from the centre to the edges of its tile
+    margin = min(x - col * TILE_SIZE, (col + 1) * TILE_SIZE - x,
+                 y - row * TILE_SIZE, (row + 1) * TILE_SIZE - y)
+    best = []
+    visited = {particle.id}
+    for ring in range(radius + 1):
+        for p in index.query_ring(row, col, ring):
+            if p in visited:
                 continue
-            if tp == Block:
-                yield Block.block_group[public_namespace.tile_map[particle.map_name][x][
-                    y]]
-            else:
-                ps = public_namespace.game_map[particle.map_name][x][y]
-                for p in ps.copy():
-                    item = Particle.particle_group[p]
-                    if item.id not in yielded:
-                        if tp is not None:
-                            if not isinstance(item, tp):
-                                continue
-                        yielded.add(item.id)
-                        yield item
+            visited.add(p)
+            other = Particle.particle_group[p]
+            if tp is not None and not isinstance(other, tp):
+                continue
+            if evaluator is not None:
+                if OTHER_PREFIX in prefixes:
+                    contract[OTHER_PREFIX] = other
+                if not evaluator.eval(contract):
+                    continue
+            distance = math.hypot(other.x + other.diameter / 2 - x,
+                                  other.y + other.diameter / 2 - y)
+            bisect.insort(best, (distance, p))
+            del best[k:]
+        # particles outside of the visited rings are at least this far away
+        if len(best) == k and best[-1][0] <= ring * TILE_SIZE + margin - 1:
+            break
+    return [Particle.particle_group[p] for _, p in best]
+
+
+def blocks_ray(block: Block) -> bool:
+    """ Return whether the tile can't be seen through """
+    return block.solid or \
+        block.get_stat('light_resistance') >= MAX_BRIGHTNESS
+
+
+def raycast(map_name: str, start: Tuple[float, float],
+            end: Tuple[float, float],
+            stop_if: Optional[Callable[[Particle], bool]] = None) \
+        -> Optional[Tuple[Particle, float]]:
+    """ Walk the tiles crossed by the segment from start to end and return
+    the first thing it runs into along with the distance to it. The segment
+    is stopped by tiles that block rays and by particles for which stop_if
+    returns True, None if nothing stops it before end or the edge of the map.
+
+    >>> from spatial_index import SpatialIndex
+    >>> public_namespace.game_map['ray'] = SpatialIndex(6, 1)
+    >>> public_namespace.typed_map['ray'] = {
+    ...     tp: SpatialIndex(6, 1) for tp in INDEXED_TYPES}
+    >>> tiles = [[-1] * 6]
+    >>> public_namespace.tile_map['ray'] = tiles
+    >>> def place(col, solid, resistance):
+    ...     block = Block({'x': col * TILE_SIZE, 'y': 0, 'map_name': 'ray',
+    ...                    'diameter': TILE_SIZE, 'solid': solid,
+    ...                    'light_resistance': resistance})
+    ...     tiles[0][col] = block.id
+    ...     return block
+    >>> floors = [place(col, False, 40) for col in (0, 1, 2, 3, 5)]
+    >>> wall = place(4, True, MAX_BRIGHTNESS)
+    >>> ghost = Particle({'x': 110, 'y': 30, 'diameter': 30,
+    ...                   'map_name': 'ray'})
+    >>> crate = Particle({'x': 200, 'y': 30, 'diameter': 30, 'solid': True,
+    ...                   'map_name': 'ray'})
+    >>> hit, distance = raycast('ray', (10, 48), (570, 48))
+    >>> hit is wall, round(distance, 3)
+    (True, 374.0)
+    >>> hit, distance = raycast('ray', (10, 48), (570, 48),
+    ...                         lambda p: p.solid)
+    >>> hit is crate, round(distance, 3)
+    (True, 190.0)
+    >>> raycast('ray', (10, 48), (300, 48)) is None
+    True
+    >>> for p in floors + [wall, ghost, crate]:
+    ...     p.remove()
+    """
+    tiles = public_namespace.tile_map[map_name]
+    index = public_namespace.game_map[map_name]
+    delta = (end[0] - start[0], end[1] - start[1])
+    checked = set()
+    hit = None
+    impact = None
+    for row, col, t_enter, t_exit in traverse_tiles(start, end):
+        if not (0 <= row < index.height and 0 <= col < index.width):
+            break
+        block = tiles[row][col]
+        if not block == -1 and blocks_ray(Block.block_group[block]):
+            if hit is None or t_enter < impact:
+                hit = Block.block_group[block]
+                impact = t_enter
+            break
+        if stop_if is not None:
+            for p in index.query_tile(row, col):
+                if p in checked:
+                    continue
+                checked.add(p)
+                particle = Particle.particle_group[p]
+                if not stop_if(particle):
+                    continue
+                t = particle.ray_impact(start, delta)
+                if t is not None and (hit is None or t < impact):
+                    hit = particle
+                    impact = t
+        # particles in later tiles are hit after t_exit
+        if hit is not None and impact <= t_exit:
+            break
+    if hit is None:
+        return None
+    return hit, impact * math.hypot(delta[0], delta[1])
+
+
+def query_shape(map_name: str, shape: str, x: float, y: float,
+                diameter: int, component: Optional[type] = Living) \
+        -> List[Particle]:
+    """ Return particles of the component type on the map that collide with
+    an object of the given shape, position and diameter, every particle is
+    returned if component is None.
+    """
+    rect = tile_rect(x, y, diameter)
+    if component in INDEXED_TYPES:
+        ids = public_namespace.typed_map[map_name][component].query_rect(rect)
+        component = None
+    else:
+        ids = public_namespace.game_map[map_name].query_rect(rect)
+    candidates = []
+    for p in ids:
+        particle = Particle.particle_group[p]
+        if component is None or isinstance(particle, component):
+            candidates.append(particle)
+    if len(candidates) == 0:
+        return []
+    hits = shape_collisions(shape, x, y, diameter,
+                            *collidable_arrays(candidates))
+    return [particle for particle, hit in zip(candidates, hits) if hit]
 
 
 def get_nearby_particles(particle: Particle) -> Set[int]:
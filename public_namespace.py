@@ -1,8 +1,11 @@
 """ This module can be accessed from everywhere else. """
 
 import pygame
-from typing import Tuple
+from typing import Optional, Tuple
 from error import UnknownTextureError
+from data_structures import LRUCache
+from settings import TEXTURE_CACHE_BUDGET, ROTATION_STEPS, \
+    TEXT_CACHE_BUDGET, DEFAULT_FONT_SIZE, MIN_CAMERA_SCALE, CAMERA_SCALE_STEP
 
 # input handling
 input_handler = None
@@ -10,19 +13,58 @@ input_handler = None
 # loaded assets
 images = {}
 sounds = {}
+fonts = {}  # dict[Tuple[Optional[str], int], pygame.font.Font]
 
-# parameterized assets
-par_images = {}
+
+def surface_bytes(surface: pygame.Surface) -> int:
+    """ Return the number of bytes used by the pixels of the surface """
+    return surface.get_pitch() * surface.get_height()
+
+
+# parameterized assets, shared by all texture lookups
+par_images = LRUCache(TEXTURE_CACHE_BUDGET, surface_bytes)
+
+# rendered texts and glyphs, shared by all text lookups
+texts = LRUCache(TEXT_CACHE_BUDGET, surface_bytes)
 
 # Camera Scaling
-scale = 1
+zoom = 1  # requested camera scale
+scale = 1  # displayed camera scale, zoom snapped to its bucket
 
 # predefined objects
 predefined_objects = {}
 
 # Game map
-game_map = {}  # dict[str, List[List[List[int]]]]
+game_map = {}  # dict[str, SpatialIndex]
+typed_map = {}  # dict[str, dict[type, SpatialIndex]]
 tile_map = {}
+solid_map = {}  # dict[str, TileBitmap]
+light_map = {}  # dict[str, LightMap]
+tile_layer = {}  # dict[str, TileLayer]
+
+
+def snap_direction(direction: float) -> float:
+    """ Return the rotation step closest to the direction, in degrees
+
+    >>> snap_direction(10)
+    11.25
+    >>> snap_direction(359)
+    0.0
+    """
+    step = 360 / ROTATION_STEPS
+    return round(direction / step) % ROTATION_STEPS * step
+
+
+def snap_scale(zoom: float) -> float:
+    """ Return the scale bucket closest to the zoom
+
+    >>> snap_scale(1.07)
+    1.05
+    >>> snap_scale(1.5)
+    1.5
+    """
+    steps = round((zoom - MIN_CAMERA_SCALE) / CAMERA_SCALE_STEP)
+    return round(MIN_CAMERA_SCALE + steps * CAMERA_SCALE_STEP, 4)
 
 
 def get_texture_by_info(name: str, size: Tuple[int, int], direction: float,
@@ -30,19 +72,81 @@ def get_texture_by_info(name: str, size: Tuple[int, int], direction: float,
         -> pygame.Surface:
     """ Return the texture with the given info, if texture with the given
     configuration does not exist generate the texture with this configuration
-    and return it.
+    and return it. The direction snaps to the closest rotation step. The
+    texture is shared by all callers and must not be modified, use
+    get_writable_texture to draw on it.
+    """
+    direction = snap_direction(direction)
+    tup = (name, size, direction, alpha)
+    texture = par_images.get(tup)
+    if texture is not None:
+        return texture
+    texture = get_writable_texture(name, size, direction, alpha)
+    par_images.put(tup, texture)
+    return texture
+
+
+def get_font(name: Optional[str] = None,
+             size: int = DEFAULT_FONT_SIZE) -> pygame.font.Font:
+    """ Return the font of the given file and size, the font is loaded on
+    its first use. The default font of pygame is used if name is None.
+    """
+    key = (name, size)
+    if key not in fonts:
+        fonts[key] = pygame.font.Font(name, size)
+    return fonts[key]
+
+
+def render_text(text: str, color: Tuple[int, int, int],
+                antialias: bool = True, name: Optional[str] = None,
+                size: int = DEFAULT_FONT_SIZE) -> pygame.Surface:
+    """ Return the text rendered with the given font, the surface is shared
+    by all callers and must not be modified
+    """
+    key = (name, size, text, color, antialias)
+    surface = texts.get(key)
+    if surface is None:
+        surface = get_font(name, size).render(text, antialias, color)
+        texts.put(key, surface)
+    return surface
+
+
+def blit_glyphs(screen: pygame.Surface, text: str,
+                location: Tuple[int, int], color: Tuple[int, int, int],
+                antialias: bool = True, name: Optional[str] = None,
+                size: int = DEFAULT_FONT_SIZE) -> pygame.Rect:
+    """ Blit the text onto the screen character by character and return the
+    area drawn on. Each character is rendered once, which suits frequently
+    changing texts such as numbers.
+
+    >>> pygame.font.init()
+    >>> screen = pygame.Surface((100, 30))
+    >>> area = blit_glyphs(screen, '12', (0, 0), (255, 255, 255))
+    >>> area.size == get_font().size('12')
+    True
+    """
+    x, y = location
+    blits = []
+    for char in text:
+        glyph = render_text(char, color, antialias, name, size)
+        blits.append((glyph, (x, y)))
+        x += glyph.get_width()
+    height = get_font(name, size).get_height()
+    screen.blits(blits, doreturn=False)
+    return pygame.Rect(location, (x - location[0], height))
+
+
+def get_writable_texture(name: str, size: Tuple[int, int], direction: float,
+                         alpha: int) -> pygame.Surface:
+    """ Return a new texture with the given info that can be drawn on
+    without affecting the cached textures, the direction snaps to the closest
+    rotation step. The texture is not cached.
     """
     try:
-        tup = (name, size, direction, alpha)
-        try:
-            return par_images[tup].copy()
-        except KeyError:
-            raw_texture = images[name]
-            par_images[(name, raw_texture.get_size(), 0, 0)] = raw_texture
-            scaled = pygame.transform.scale(raw_texture, size)
-            rotated = pygame.transform.rotate(scaled, direction)
-            rotated.set_alpha(alpha)
-            par_images[tup] = rotated
-            return rotated.copy()
+        raw_texture = images[name]
     except KeyError:
         raise UnknownTextureError
+    scaled = pygame.transform.scale(raw_texture, size)
+    rotated = pygame.transform.rotate(scaled, snap_direction(direction))
+    rotated.set_alpha(alpha)
+    return rotated
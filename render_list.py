@@ -0,0 +1,52 @@
+from typing import Dict, List, Tuple
+import pygame
+
+
+class RenderList:
+    """
+    Description: Blits of a frame grouped by display layer. Layers are drawn
+    from the lowest display priority up, blits within a layer are drawn in
+    the order they were added, with one batched call per layer.
+
+    === Private Attributes ===
+    - _layers: Blits of each layer, accessed by display priority
+    """
+    _layers: Dict[int, List[Tuple[pygame.Surface, Tuple[float, float]]]]
+
+    def __init__(self) -> None:
+        self._layers = {}
+
+    def add(self, priority: int, surface: pygame.Surface,
+            position: Tuple[float, float]) -> None:
+        """ Add the blit of the surface at the position to the layer of the
+        given display priority
+        """
+        try:
+            self._layers[priority].append((surface, position))
+        except KeyError:
+            self._layers[priority] = [(surface, position)]
+
+    def submit(self, screen: pygame.Surface) -> List[pygame.Rect]:
+        """ Draw all added blits onto the screen, empty this list and return
+        the areas of the screen drawn on
+
+        >>> surface = pygame.Surface((1, 1))
+        >>> screen = pygame.Surface((2, 1))
+        >>> render_list = RenderList()
+        >>> surface.fill((255, 0, 0))
+        <rect(0, 0, 1, 1)>
+        >>> render_list.add(2, surface.copy(), (0, 0))
+        >>> surface.fill((0, 255, 0))
+        <rect(0, 0, 1, 1)>
+        >>> render_list.add(1, surface, (0, 0))
+        >>> render_list.add(1, surface, (1, 0))
+        >>> render_list.submit(screen)
+        [<rect(0, 0, 1, 1)>, <rect(1, 0, 1, 1)>, <rect(0, 0, 1, 1)>]
+        >>> screen.get_at((0, 0)), screen.get_at((1, 0))
+        ((255, 0, 0, 255), (0, 255, 0, 255))
+        """
+        rects = []
+        for priority in sorted(self._layers):
+            rects.extend(screen.blits(self._layers[priority]))
+        self._layers = {}
+        return rects
@@ -2,7 +2,10 @@ SCREEN_SIZE = (1200, 900)
 ICON = 'Lobster.png'
 CAPTION = 'Lobster Remake'
 FPS = 60
+DIRTY_RECT_PRESENTATION = False  # present only the changed areas of the screen
 TILE_SIZE = 96
+TILE_CHUNK_SIZE = 8  # tiles per side of each pre-rendered chunk
+TILE_CHUNK_BUDGET = 128 * 1024 * 1024  # bytes of pre-rendered chunks per map
 IMAGE_PATH = "assets/images"
 MAP_PATH = "assets/maps"
 MUSIC_PATH = "assets/music"
@@ -14,6 +17,8 @@ SHAPES = [SQUARE, CIRCLE]
 
 #
 PARTICLE_UPDATE_RADIUS = 12
+CONTACT_SAMPLES = 8  # pixels after a time of impact a contact is looked for
+CONTACT_BISECTION_STEPS = 16  # steps narrowing down contacts of moving particles
 
 #
 SELF_PREFIX = "self"
@@ -22,10 +27,30 @@ OTHER_PREFIX = "other"
 #
 MAX_CAMERA_SCALE = 1.5
 MIN_CAMERA_SCALE = 1
+CAMERA_SCALE_STEP = 0.05  # the camera scale snaps to buckets of this size
 
 #
 INTERACT_RANGE = int(TILE_SIZE // 2)
 
+# Lighting
+MAX_BRIGHTNESS = 256
+DEFAULT_LIGHT_COLOR = (255, 255, 255)
+FLOOD_LIGHTING = 'flood'
+SHADOWCAST_LIGHTING = 'shadowcast'
+LIGHTING_MODES = [FLOOD_LIGHTING, SHADOWCAST_LIGHTING]
+SHADOWCAST_FALLOFF = 40  # brightness lost per tile in shadowcast mode
+LIGHT_UPDATE_BUDGET = 2048  # tiles relit by static sources per frame
+SMOOTH_SHADE = False  # scale the shade overlay bilinearly
+
+# Textures
+TEXTURE_CACHE_BUDGET = 64 * 1024 * 1024  # bytes of scaled/rotated textures
+ROTATION_STEPS = 64  # textures are rotated to the closest of these steps
+ROTATION_PRERENDER_BUDGET = 16  # rotations pre-rendered per frame
+
+# Text
+TEXT_CACHE_BUDGET = 4 * 1024 * 1024  # bytes of rendered text surfaces
+DEFAULT_FONT_SIZE = 25
+
 #
 ITEM_IMAGE_SIZE = 32
 ITEM_COLLISION_DIAMETER = 60
@@ -90,6 +115,7 @@ DEFAULT_PROJECTILE_SPEED = 500
 FIREBALL_EXPLOSION_RANGE = TILE_SIZE // 2
 FIREBALL_TEXTURE = 'fireball.png'
 FIREBALL_BRIGHTNESS = 256
+FIREBALL_LIGHT_COLOR = (255, 160, 64)
 
 # Action priorities, higher priority actions will be executed first
 BUFF_PRIORITY = 4
@@ -0,0 +1,458 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from array import array
+import math
+from settings import TILE_SIZE
+
+EMPTY = -1
+
+TileRect = Tuple[int, int, int, int]
+
+# neighbourhood masks by (radius, corner)
+_masks = {}
+
+
+class SpatialIndex:
+    """
+    Description: Occupancy grid of a game map. Every tile owns a bucket of
+    particle ids. Buckets are singly linked lists whose nodes live in
+    preallocated int arrays sharing a single free list, moving a particle
+    relinks nodes instead of allocating new containers.
+
+    === Public Attributes ===
+    - width: width of the grid (in tiles)
+    - height: height of the grid (in tiles)
+
+    === Private Attributes ===
+    - _heads: Index of the first node of each tile's bucket, tiles are stored
+        in row-major order
+    - _next: Index of the next node in the same bucket, for free nodes this is
+        the next free node
+    - _ids: The particle id stored in each node
+    - _free: Index of the first free node
+    - _rects: The tile rectangle (start_row, start_col, end_row, end_col)
+        occupied by each inserted particle
+
+    === Representation Invariants ===
+    - len(_heads) == width * height
+    - len(_next) == len(_ids)
+    """
+    width: int
+    height: int
+    _heads: array
+    _next: array
+    _ids: array
+    _free: int
+    _rects: Dict[int, TileRect]
+
+    def __init__(self, width: int, height: int,
+                 capacity: Optional[int] = None) -> None:
+        self.width = width
+        self.height = height
+        if capacity is None:
+            capacity = width * height * 2
+        capacity = max(capacity, 1)
+        self._heads = array('i', [EMPTY]) * (width * height)
+        self._next = array('i', range(1, capacity + 1))
+        self._next[-1] = EMPTY
+        self._ids = array('i', [EMPTY]) * capacity
+        self._free = 0
+        self._rects = {}
+
+    def __contains__(self, pid: int) -> bool:
+        return pid in self._rects
+
+    def insert(self, pid: int, rect: TileRect) -> None:
+        """ Insert the particle into every tile covered by rect
+
+        >>> index = SpatialIndex(4, 3)
+        >>> index.insert(7, (0, 0, 1, 1))
+        >>> index.query_tile(1, 1)
+        [7]
+        >>> index.query_tile(2, 2)
+        []
+        """
+        if pid in self._rects:
+            self.move(pid, rect)
+            return
+        self._rects[pid] = rect
+        for cell in self._cells(rect):
+            self._link(cell, pid)
+
+    def move(self, pid: int, rect: TileRect) -> None:
+        """ Move the particle to the tiles covered by rect, only tiles that
+        are entered or left are touched.
+
+        >>> index = SpatialIndex(4, 3)
+        >>> index.insert(7, (0, 0, 0, 0))
+        >>> index.move(7, (0, 0, 0, 1))
+        >>> index.query_tile(0, 0), index.query_tile(0, 1)
+        ([7], [7])
+        >>> index.move(7, (2, 3, 2, 3))
+        >>> index.query_tile(0, 0), index.query_tile(2, 3)
+        ([], [7])
+        """
+        old = self._rects.get(pid)
+        if old is None:
+            self.insert(pid, rect)
+            return
+        if old == rect:
+            return
+        self._rects[pid] = rect
+        for cell in self._cells(old):
+            if not _rect_has(rect, cell // self.width, cell % self.width):
+                self._unlink(cell, pid)
+        for cell in self._cells(rect):
+            if not _rect_has(old, cell // self.width, cell % self.width):
+                self._link(cell, pid)
+
+    def remove(self, pid: int) -> None:
+        """ Remove the particle from the grid, does nothing if it's not in
+        the grid.
+
+        >>> index = SpatialIndex(4, 3)
+        >>> index.insert(7, (0, 0, 1, 1))
+        >>> index.remove(7)
+        >>> index.query_tile(1, 1)
+        []
+        >>> 7 in index
+        False
+        """
+        rect = self._rects.pop(pid, None)
+        if rect is None:
+            return
+        for cell in self._cells(rect):
+            self._unlink(cell, pid)
+
+    def get_rect(self, pid: int) -> Optional[TileRect]:
+        """ Return the tile rectangle occupied by the particle """
+        return self._rects.get(pid)
+
+    def query_tile(self, row: int, col: int) -> List[int]:
+        """ Return ids of particles inside the given tile, tiles outside of
+        the grid are empty.
+        """
+        if not (0 <= row < self.height and 0 <= col < self.width):
+            return []
+        returning = []
+        ids = self._ids
+        nxt = self._next
+        node = self._heads[row * self.width + col]
+        while not node == EMPTY:
+            returning.append(ids[node])
+            node = nxt[node]
+        return returning
+
+    def query_tiles(self, coordinates: Iterable[Tuple[int, int]]) -> Set[int]:
+        """ Return ids of particles inside the tiles given by (row, col)
+        coordinates
+
+        >>> index = SpatialIndex(4, 3)
+        >>> index.insert(1, (0, 0, 0, 1))
+        >>> index.insert(2, (0, 1, 1, 1))
+        >>> sorted(index.query_tiles([(0, 0), (0, 1)]))
+        [1, 2]
+        """
+        returning = set()
+        for row, col in coordinates:
+            returning.update(self.query_tile(row, col))
+        return returning
+
+    def query_rect(self, rect: TileRect) -> Set[int]:
+        """ Return ids of particles inside the tiles covered by rect, the
+        rectangle is clamped to the grid.
+        """
+        start_row, start_col, end_row, end_col = rect
+        start_row = max(start_row, 0)
+        start_col = max(start_col, 0)
+        end_row = min(end_row, self.height - 1)
+        end_col = min(end_col, self.width - 1)
+        returning = set()
+        for row in range(start_row, end_row + 1):
+            for col in range(start_col, end_col + 1):
+                returning.update(self.query_tile(row, col))
+        return returning
+
+    def query_ring(self, row: int, col: int, radius: int) -> Set[int]:
+        """ Return ids of particles inside the tiles exactly radius tiles away
+        from (row, col) in chebyshev distance
+
+        >>> index = SpatialIndex(5, 5)
+        >>> index.insert(1, (2, 2, 2, 2))
+        >>> index.insert(2, (0, 4, 0, 4))
+        >>> index.insert(3, (1, 1, 1, 1))
+        >>> index.query_ring(2, 2, 0), index.query_ring(2, 2, 1)
+        ({1}, {3})
+        >>> index.query_ring(2, 2, 2)
+        {2}
+        """
+        if radius == 0:
+            return set(self.query_tile(row, col))
+        returning = set()
+        for c in range(col - radius, col + radius + 1):
+            returning.update(self.query_tile(row - radius, c))
+            returning.update(self.query_tile(row + radius, c))
+        for r in range(row - radius + 1, row + radius):
+            returning.update(self.query_tile(r, col - radius))
+            returning.update(self.query_tile(r, col + radius))
+        return returning
+
+    def _cells(self, rect: TileRect) -> Iterable[int]:
+        """ Generate the cell indices covered by rect """
+        start_row, start_col, end_row, end_col = rect
+        for row in range(start_row, end_row + 1):
+            base = row * self.width
+            for col in range(start_col, end_col + 1):
+                yield base + col
+
+    def _link(self, cell: int, pid: int) -> None:
+        """ Push pid onto the bucket of the given cell """
+        if self._free == EMPTY:
+            self._grow()
+        node = self._free
+        self._free = self._next[node]
+        self._ids[node] = pid
+        self._next[node] = self._heads[cell]
+        self._heads[cell] = node
+
+    def _unlink(self, cell: int, pid: int) -> None:
+        """ Remove pid from the bucket of the given cell """
+        prev = EMPTY
+        node = self._heads[cell]
+        while not node == EMPTY:
+            if self._ids[node] == pid:
+                if prev == EMPTY:
+                    self._heads[cell] = self._next[node]
+                else:
+                    self._next[prev] = self._next[node]
+                self._ids[node] = EMPTY
+                self._next[node] = self._free
+                self._free = node
+                return
+            prev = node
+            node = self._next[node]
+
+    def _grow(self) -> None:
+        """ Double the capacity of the node pool
+
+        >>> index = SpatialIndex(1, 1, 1)
+        >>> for i in range(5):
+        ...     index.insert(i, (0, 0, 0, 0))
+        >>> sorted(index.query_tile(0, 0))
+        [0, 1, 2, 3, 4]
+        """
+        size = len(self._ids)
+        self._next.extend(range(size + 1, size * 2 + 1))
+        self._next[-1] = EMPTY
+        self._ids.extend(array('i', [EMPTY]) * size)
+        self._free = size
+
+
+class TileBitmap:
+    """
+    Description: One flag per tile of a game map, stored in a bytearray in
+    row-major order.
+
+    === Public Attributes ===
+    - width: width of the grid (in tiles)
+    - height: height of the grid (in tiles)
+
+    === Private Attributes ===
+    - _bits: The flag of each tile
+
+    === Representation Invariants ===
+    - len(_bits) == width * height
+    """
+    width: int
+    height: int
+    _bits: bytearray
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        self._bits = bytearray(width * height)
+
+    def get(self, row: int, col: int) -> bool:
+        """ Return the flag of the tile, tiles outside of the grid are unset
+
+        >>> bitmap = TileBitmap(4, 3)
+        >>> bitmap.set(2, 3, True)
+        >>> bitmap.get(2, 3), bitmap.get(3, 2), bitmap.get(-1, 0)
+        (True, False, False)
+        """
+        if not (0 <= row < self.height and 0 <= col < self.width):
+            return False
+        return self._bits[row * self.width + col] == 1
+
+    def set(self, row: int, col: int, value: bool) -> None:
+        """ Set the flag of the tile """
+        self._bits[row * self.width + col] = 1 if value else 0
+
+    def query_rect(self, rect: TileRect) -> List[Tuple[int, int]]:
+        """ Return (row, col) of the set tiles covered by rect
+
+        >>> bitmap = TileBitmap(4, 3)
+        >>> bitmap.set(0, 1, True)
+        >>> bitmap.set(2, 2, True)
+        >>> bitmap.query_rect((-1, -1, 1, 3))
+        [(0, 1)]
+        """
+        start_row = max(rect[0], 0)
+        start_col = max(rect[1], 0)
+        end_row = min(rect[2], self.height - 1)
+        end_col = min(rect[3], self.width - 1)
+        bits = self._bits
+        returning = []
+        for row in range(start_row, end_row + 1):
+            base = row * self.width
+            for col in range(start_col, end_col + 1):
+                if bits[base + col]:
+                    returning.append((row, col))
+        return returning
+
+
+def neighbourhood_mask(radius: int, corner: bool) \
+        -> Tuple[Tuple[int, int], ...]:
+    """ Return the (row, col) offsets of the tiles within radius of a tile in
+    row-major order, tiles further than radius in manhattan distance are
+    excluded unless corner is True. Masks are computed once.
+
+    >>> neighbourhood_mask(1, False)
+    ((-1, 0), (0, -1), (0, 0), (0, 1), (1, 0))
+    >>> len(neighbourhood_mask(2, True))
+    25
+    """
+    key = (radius, corner)
+    if key not in _masks:
+        mask = []
+        for row in range(-radius, radius + 1):
+            for col in range(-radius, radius + 1):
+                if corner or abs(col) <= radius - abs(row):
+                    mask.append((row, col))
+        _masks[key] = tuple(mask)
+    return _masks[key]
+
+
+def traverse_tiles(start: Tuple[float, float], end: Tuple[float, float]) \
+        -> Iterable[Tuple[int, int, float, float]]:
+    """ Generate (row, col, t_enter, t_exit) of the tiles crossed by the
+    segment from start to end in order, where the segment is inside the tile
+    for start + t * (end - start) with t_enter <= t <= t_exit.
+
+    >>> for tile in traverse_tiles((48, 48), (240, 144)):
+    ...     print(tile)
+    (0, 0, 0, 0.25)
+    (0, 1, 0.25, 0.5)
+    (1, 1, 0.5, 0.75)
+    (1, 2, 0.75, 1)
+    >>> list(traverse_tiles((10, 10), (10, 10)))
+    [(0, 0, 0, 1)]
+    """
+    dx = end[0] - start[0]
+    dy = end[1] - start[1]
+    col = int(start[0] // TILE_SIZE)
+    row = int(start[1] // TILE_SIZE)
+    end_col = int(end[0] // TILE_SIZE)
+    end_row = int(end[1] // TILE_SIZE)
+    step_col = 1 if dx > 0 else -1
+    step_row = 1 if dy > 0 else -1
+    if dx == 0:
+        next_x = math.inf
+        delta_x = math.inf
+    else:
+        boundary = (col + (1 if dx > 0 else 0)) * TILE_SIZE
+        next_x = (boundary - start[0]) / dx
+        delta_x = TILE_SIZE / abs(dx)
+    if dy == 0:
+        next_y = math.inf
+        delta_y = math.inf
+    else:
+        boundary = (row + (1 if dy > 0 else 0)) * TILE_SIZE
+        next_y = (boundary - start[1]) / dy
+        delta_y = TILE_SIZE / abs(dy)
+    t = 0
+    while True:
+        t_exit = min(next_x, next_y, 1)
+        yield row, col, t, t_exit
+        if t_exit >= 1 or (row == end_row and col == end_col):
+            return
+        t = t_exit
+        if next_x < next_y:
+            col += step_col
+            next_x += delta_x
+        else:
+            row += step_row
+            next_y += delta_y
+
+
+def _rect_has(rect: TileRect, row: int, col: int) -> bool:
+    """ Return whether the tile is covered by rect """
+    return rect[0] <= row <= rect[2] and rect[1] <= col <= rect[3]
+
+
+def rect_difference(rect: Optional[TileRect], other: Optional[TileRect]) \
+        -> Iterable[Tuple[int, int]]:
+    """ Generate (row, col) of tiles covered by rect but not by other, None
+    covers no tiles.
+
+    >>> list(rect_difference((0, 0, 1, 1), (1, 0, 2, 1)))
+    [(0, 0), (0, 1)]
+    >>> list(rect_difference((0, 0, 0, 0), None))
+    [(0, 0)]
+    """
+    if rect is None:
+        return
+    for row in range(rect[0], rect[2] + 1):
+        for col in range(rect[1], rect[3] + 1):
+            if other is None or not _rect_has(other, row, col):
+                yield row, col
+
+
+def pixel_bounds(rect: TileRect, diameter: int) -> Tuple[int, int, int, int]:
+    """ Return the (min_x, min_y, max_x, max_y) range of integer positions at
+    which an object of the given diameter covers exactly the tiles of rect.
+
+    >>> pixel_bounds(tile_rect(50, 100, 96), 96)
+    (1, 97, 95, 191)
+    >>> all(tile_rect(x, 0, 30) == (0, 0, 0, 0) for x in range(67))
+    True
+    >>> pixel_bounds((0, 0, 0, 0), 30)
+    (0, 0, 66, 66)
+    """
+    min_x = max(rect[1] * TILE_SIZE, rect[3] * TILE_SIZE - diameter + 1)
+    min_y = max(rect[0] * TILE_SIZE, rect[2] * TILE_SIZE - diameter + 1)
+    max_x = min(rect[1] * TILE_SIZE + TILE_SIZE - 1,
+                rect[3] * TILE_SIZE + TILE_SIZE - diameter)
+    max_y = min(rect[0] * TILE_SIZE + TILE_SIZE - 1,
+                rect[2] * TILE_SIZE + TILE_SIZE - diameter)
+    return min_x, min_y, max_x, max_y
+
+
+def tile_rect(x: float, y: float, diameter: int) -> TileRect:
+    """ Return the rectangle of tiles covered by the object with the given
+    position and diameter.
+
+    >>> tile_rect(0, 0, 96)
+    (0, 0, 0, 0)
+    >>> tile_rect(50, 100, 96)
+    (1, 0, 2, 1)
+    """
+    return (int(y // TILE_SIZE), int(x // TILE_SIZE),
+            int((y + diameter - 1) // TILE_SIZE),
+            int((x + diameter - 1) // TILE_SIZE))
+
+
+def swept_tile_rect(x: float, y: float, dx: float, dy: float,
+                    diameter: int) -> TileRect:
+    """ Return the rectangle of tiles covered by the object with the given
+    position and diameter while it moves by (dx, dy).
+
+    >>> swept_tile_rect(0, 0, 100, -10, 96)
+    (-1, 0, 0, 2)
+    """
+    min_x = min(x, x + dx)
+    min_y = min(y, y + dy)
+    max_x = max(x, x + dx)
+    max_y = max(y, y + dy)
+    return (int(min_y // TILE_SIZE), int(min_x // TILE_SIZE),
+            int((max_y + diameter - 1) // TILE_SIZE),
+            int((max_x + diameter - 1) // TILE_SIZE))
@@ -0,0 +1,100 @@
+from typing import List, Set, Tuple
+import math
+import pygame
+import public_namespace
+from data_structures import LRUCache
+from particles import Particle
+from settings import TILE_SIZE, TILE_CHUNK_SIZE, TILE_CHUNK_BUDGET
+
+Chunk = Tuple[int, int, int]
+
+
+class TileLayer:
+    """
+    Description: Pre-rendered tiles of a game map. Tiles are drawn onto
+    opaque chunks of TILE_CHUNK_SIZE x TILE_CHUNK_SIZE tiles, chunks are kept
+    for every scale bucket displayed until they are evicted or one of their
+    tiles changes.
+
+    === Public Attributes ===
+    - width: width of the map (in tiles)
+    - height: height of the map (in tiles)
+    - tiles: Ids of the tiles of the map, -1 if a position has no tile
+
+    === Private Attributes ===
+    - _sizes: Tile sizes in pixels the chunks have been rendered with
+    - _chunks: Rendered chunks, accessed by (tile size, chunk row, chunk col)
+
+    === Representation Invariants ===
+    - The tile size of every chunk in _chunks is in _sizes
+    """
+    width: int
+    height: int
+    tiles: List[List[int]]
+    _sizes: Set[int]
+    _chunks: LRUCache
+
+    def __init__(self, tiles: List[List[int]], width: int,
+                 height: int) -> None:
+        self.tiles = tiles
+        self.width = width
+        self.height = height
+        self._sizes = set()
+        self._chunks = LRUCache(TILE_CHUNK_BUDGET,
+                                public_namespace.surface_bytes)
+
+    def invalidate(self, row: int, col: int) -> None:
+        """ Redraw the chunk of the tile before it is displayed again """
+        for size in self._sizes:
+            self._chunks.pop((size, row // TILE_CHUNK_SIZE,
+                              col // TILE_CHUNK_SIZE))
+
+    def display(self, screen: pygame.Surface, start_row: int, start_col: int,
+                end_row: int, end_col: int, begin_x: int,
+                begin_y: int) -> List[pygame.Rect]:
+        """ Display the chunks overlapping the given rect of tiles, the tile
+        at (start_row, start_col) is displayed at (begin_x, begin_y). Return
+        the areas of the screen covered by chunks redrawn for this display.
+        """
+        size = math.ceil(TILE_SIZE * public_namespace.scale)
+        self._sizes.add(size)
+        step = TILE_CHUNK_SIZE * size
+        redrawn = []
+        for cr in range(max(start_row, 0) // TILE_CHUNK_SIZE,
+                        min(end_row, self.height - 1) // TILE_CHUNK_SIZE + 1):
+            for cc in range(max(start_col, 0) // TILE_CHUNK_SIZE,
+                            min(end_col, self.width - 1) //
+                            TILE_CHUNK_SIZE + 1):
+                surface = self._chunks.get((size, cr, cc))
+                fresh = surface is None
+                if fresh:
+                    surface = self._render(screen, size, cr, cc)
+                    self._chunks.put((size, cr, cc), surface)
+                rect = screen.blit(surface,
+                                   (begin_x + cc * step - start_col * size,
+                                    begin_y + cr * step - start_row * size))
+                if fresh:
+                    redrawn.append(rect)
+        return redrawn
+
+    def _render(self, screen: pygame.Surface, size: int, cr: int,
+                cc: int) -> pygame.Surface:
+        """ Return the chunk at the given chunk row and column drawn with tiles
+        of the given size, in the pixel format of the screen. Positions
+        without a tile are left black, which is the colour the screen is
+        cleared with.
+        """
+        rows = range(cr * TILE_CHUNK_SIZE,
+                     min((cr + 1) * TILE_CHUNK_SIZE, self.height))
+        cols = range(cc * TILE_CHUNK_SIZE,
+                     min((cc + 1) * TILE_CHUNK_SIZE, self.width))
+        surface = pygame.Surface((len(cols) * size, len(rows) * size), 0,
+                                 screen)
+        surface.fill((0, 0, 0))
+        for i in range(len(rows)):
+            for j in range(len(cols)):
+                tile = self.tiles[rows[i]][cols[j]]
+                if tile in Particle.particle_group:
+                    surface.blit(Particle.particle_group[tile].get_texture(),
+                                 (j * size, i * size))
+        return surface
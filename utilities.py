@@ -5,7 +5,15 @@ from expression_trees import ObjectAttributeEvaluator
 from settings import *
 from data_structures import WeightedPriorityQueue, PriorityQueue
 from item import Item, Inventory
+from math_formula import ray_box_interval, ray_circle_impact, \
+    ray_rounded_box_impact
 import math
+import numpy as np
+
+SHAPE_CODES = {
+    'square': 0,
+    'circle': 1
+}
 
 
 def compare_by_execution_priority(i1: Tuple[Staminaized, dict[str, Any], str],
@@ -270,6 +278,55 @@ class Collidable(Positional, BufferedStats):
         else:
             raise UnknownShapeError
 
+    def collides_with_tile(self, row: int, col: int) -> bool:
+        """ Return whether this object collides with a square filling the
+        tile at (row, col), same as detect_collision against that square.
+
+        >>> class Shape(Collidable, Directional):
+        ...     pass
+        >>> wall = Shape({'x': TILE_SIZE, 'y': 0, 'diameter': TILE_SIZE})
+        >>> for x, y, shape in [(40.5, 60, 'circle'), (-20, 10, 'square'),
+        ...                     (70, 70, 'circle'), (70, 30, 'square')]:
+        ...     c = Shape({'x': x, 'y': y, 'diameter': 30, 'shape': shape})
+        ...     print(c.collides_with_tile(0, 1), c.detect_collision(wall))
+        False False
+        False False
+        True True
+        True True
+        """
+        if self.diameter == 0:
+            return False
+        tx = col * TILE_SIZE
+        ty = row * TILE_SIZE
+        x = int(self.x)
+        y = int(self.y)
+        if self.shape == 'circle':
+            radius = self.diameter / 2
+            cx = x + radius - 1
+            cy = y + radius - 1
+            if tx > cx:
+                corner_x = tx
+            elif tx + TILE_SIZE - 1 < cx:
+                corner_x = tx + TILE_SIZE - 1
+            else:
+                corner_x = None
+            if ty > cy:
+                corner_y = ty
+            elif ty + TILE_SIZE - 1 < cy:
+                corner_y = ty + TILE_SIZE - 1
+            else:
+                corner_y = None
+            if corner_x is not None and corner_y is not None:
+                return math.sqrt(pow(corner_x - cx, 2) +
+                                 pow(corner_y - cy, 2)) < radius
+            # the tile is the first argument of _square_square
+            return tx - self.diameter + 1 < x < tx + TILE_SIZE and \
+                ty - self.diameter + 1 < y < ty + TILE_SIZE
+        elif self.shape == 'square':
+            return tx - self.diameter < x < tx + TILE_SIZE - 1 and \
+                ty - self.diameter < y < ty + TILE_SIZE - 1
+        raise UnknownShapeError
+
     def _square_square(self, other: Collidable) -> bool:
         """ Collision Detection between two squares """
         c1x = int(self.x)
@@ -324,6 +381,158 @@ class Collidable(Positional, BufferedStats):
     def _circle_square(self, other: Collidable) -> bool:
         return other._square_circle(self)
 
+    def time_of_impact(self, other: Collidable, dx: float, dy: float) \
+            -> Optional[float]:
+        """ Return the fraction t in [0, 1] of the displacement (dx, dy) at
+        which this object starts colliding with the stationary other object,
+        None if they don't collide along the way.
+        """
+        if other.diameter == 0 or self.diameter == 0:
+            return None
+        if self.shape == 'square':
+            if other.shape == 'square':
+                return self._square_square_toi(other, dx, dy)
+            elif other.shape == 'circle':
+                return self._square_circle_toi(other, dx, dy)
+            else:
+                raise UnknownShapeError
+        elif self.shape == 'circle':
+            if other.shape == 'square':
+                return self._circle_square_toi(other, dx, dy)
+            elif other.shape == 'circle':
+                return self._circle_circle_toi(other, dx, dy)
+            else:
+                raise UnknownShapeError
+        else:
+            raise UnknownShapeError
+
+    def tile_time_of_impact(self, row: int, col: int, dx: float,
+                            dy: float) -> Optional[float]:
+        """ Return the fraction t in [0, 1] of the displacement (dx, dy) at
+        which this object starts colliding with a square filling the tile at
+        (row, col), None if they don't collide along the way. collides_with_tile
+        truncates the coordinates of circles, the tile is grown by a pixel on
+        its far sides for them so the time is never later than the first
+        contact it detects.
+
+        >>> class Shape(Collidable, Directional):
+        ...     pass
+        >>> c = Shape({'x': 0, 'y': 0, 'diameter': 30, 'shape': 'square'})
+        >>> c.tile_time_of_impact(0, 1, 200, 0)
+        0.335
+        >>> c.shape = 'circle'
+        >>> c.tile_time_of_impact(0, 1, 200, 0)
+        0.335
+        >>> c.tile_time_of_impact(1, 1, 200, 0) is None
+        True
+        """
+        if self.diameter == 0:
+            return None
+        if self.shape == 'square':
+            return self._square_box_toi(col * TILE_SIZE, row * TILE_SIZE,
+                                        TILE_SIZE, dx, dy)
+        elif self.shape == 'circle':
+            return self._circle_box_toi(col * TILE_SIZE, row * TILE_SIZE,
+                                        TILE_SIZE + 1, dx, dy)
+        else:
+            raise UnknownShapeError
+
+    def _square_square_toi(self, other: Collidable, dx: float, dy: float) \
+            -> Optional[float]:
+        return self._square_box_toi(int(other.x), int(other.y),
+                                    other.diameter, dx, dy)
+
+    def _square_box_toi(self, ox: int, oy: int, diameter: int, dx: float,
+                        dy: float) -> Optional[float]:
+        # int(x) falls in [ox - d1 + 1, ox + d2 - 2] iff
+        # x falls in [ox - d1 + 1, ox + d2 - 1)
+        low = (ox - self.diameter + 1, oy - self.diameter + 1)
+        high = (ox + diameter - 1, oy + diameter - 1)
+        interval = ray_box_interval((self.x, self.y), (dx, dy), low, high)
+        if interval is None or interval[0] > 1 or interval[1] <= 0:
+            return None
+        return max(interval[0], 0)
+
+    def _square_circle_toi(self, other: Collidable, dx: float, dy: float) \
+            -> Optional[float]:
+        # Move the circle the opposite way against the stationary square
+        radius = other.diameter / 2
+        centre = (int(other.x) + radius - 1, int(other.y) + radius - 1)
+        low = (self.x, self.y)
+        high = (self.x + self.diameter - 1, self.y + self.diameter - 1)
+        return ray_rounded_box_impact(centre, (-dx, -dy), low, high, radius)
+
+    def _circle_square_toi(self, other: Collidable, dx: float, dy: float) \
+            -> Optional[float]:
+        return self._circle_box_toi(int(other.x), int(other.y),
+                                    other.diameter, dx, dy)
+
+    def _circle_box_toi(self, ox: int, oy: int, diameter: int, dx: float,
+                        dy: float) -> Optional[float]:
+        radius = self.diameter / 2
+        centre = (self.x + radius - 1, self.y + radius - 1)
+        low = (ox, oy)
+        high = (ox + diameter - 1, oy + diameter - 1)
+        return ray_rounded_box_impact(centre, (dx, dy), low, high, radius)
+
+    def _circle_circle_toi(self, other: Collidable, dx: float, dy: float) \
+            -> Optional[float]:
+        r1 = self.diameter / 2
+        r2 = other.diameter / 2
+        centre = (self.x + r1 - 1, self.y + r1 - 1)
+        other_centre = (int(other.x + r2 - 1), int(other.y + r2 - 1))
+        return ray_circle_impact(centre, (dx, dy), other_centre, r1 + r2)
+
+    def ray_impact(self, start: Tuple[float, float],
+                   delta: Tuple[float, float]) -> Optional[float]:
+        """ Return the smallest t in [0, 1] at which the point
+        start + t * delta is inside this object, None if there's none.
+        """
+        if self.diameter == 0:
+            return None
+        if self.shape == 'square':
+            interval = ray_box_interval(start, delta, (self.x, self.y),
+                                        (self.x + self.diameter,
+                                         self.y + self.diameter))
+            if interval is None or interval[0] > 1 or interval[1] <= 0:
+                return None
+            return max(interval[0], 0)
+        elif self.shape == 'circle':
+            radius = self.diameter / 2
+            return ray_circle_impact(start, delta, (self.x + radius,
+                                                    self.y + radius), radius)
+        raise UnknownShapeError
+
+    def detect_collisions(self, x: np.ndarray, y: np.ndarray,
+                          diameter: np.ndarray, shape: np.ndarray) \
+            -> np.ndarray:
+        """ Return a boolean mask of which objects in the given arrays collide
+        with this object, the arrays can be built by collidable_arrays. The
+        result matches detect_collision for every object.
+
+        >>> import random
+        >>> class Shape(Collidable, Directional):
+        ...     pass
+        >>> rng = random.Random(148)
+        >>> def make():
+        ...     return Shape({'x': rng.uniform(-40, 40),
+        ...                        'y': rng.uniform(-40, 40),
+        ...                        'diameter': rng.choice([0, 1, 5, 30, 45]),
+        ...                        'shape': rng.choice(['square', 'circle'])})
+        >>> others = [make() for _ in range(500)]
+        >>> arrays = collidable_arrays(others)
+        >>> mismatch = 0
+        >>> for _ in range(50):
+        ...     c = make()
+        ...     mask = c.detect_collisions(*arrays)
+        ...     expected = [c.detect_collision(o) for o in others]
+        ...     mismatch += int((mask != np.array(expected)).sum())
+        >>> mismatch
+        0
+        """
+        return shape_collisions(self.shape, self.x, self.y, self.diameter,
+                                x, y, diameter, shape)
+
 
 class Interactive:
     """ Description: Interactive units
@@ -341,25 +550,24 @@ class Lightable(BufferedStats):
     """ Description: Light interface
 
     === Public Attributes ===
-    - brightness: The brightness of this object
     - light_source: The ability of this object to produce light
     - light_resistance: The ability of this object to block light,
         does not block self-emitted light
+    - light_color: The colour of the light produced by this object
 
     Representation Invariants:
         0<= light_source <= 255
-        0<= brightness <= 255
     """
-    brightness: int
     light_source: int
     light_resistance: int
+    light_color: Tuple[int, int, int]
 
     def __init__(self, info: dict[str, Union[int, str]]) -> None:
-        attr = ['brightness', 'light_source', 'light_resistance']
+        attr = ['light_source', 'light_resistance', 'light_color']
         default = {
-            'brightness': 0,
             'light_source': 0,
-            'light_resistance': 10
+            'light_resistance': 10,
+            'light_color': DEFAULT_LIGHT_COLOR
         }
         for key in default:
             if key not in info:
@@ -813,3 +1021,88 @@ def dict_merge(d1: dict[str, Any], d2: dict[str, Any]):
                 d1[item] += d2[item]
                 continue
             raise InvalidAttrTypeError
+
+
+def collidable_arrays(objects: List[Collidable]) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """ Pack the x, y, diameter and shape code of the objects into arrays """
+    x = np.array([o.x for o in objects], dtype=np.float64)
+    y = np.array([o.y for o in objects], dtype=np.float64)
+    diameter = np.array([o.diameter for o in objects], dtype=np.float64)
+    shape = np.array([SHAPE_CODES.get(o.shape, -1) for o in objects],
+                     dtype=np.int8)
+    return x, y, diameter, shape
+
+
+def shape_collisions(shape: str, x: float, y: float, diameter: float,
+                     others_x: np.ndarray, others_y: np.ndarray,
+                     others_diameter: np.ndarray, others_shape: np.ndarray) \
+        -> np.ndarray:
+    """ Return a boolean mask of which objects in the given arrays collide
+    with an object of the given shape, position and diameter
+    """
+    if shape not in SHAPE_CODES:
+        raise UnknownShapeError
+    if np.any((others_shape != SHAPE_CODES['square']) &
+              (others_shape != SHAPE_CODES['circle'])):
+        raise UnknownShapeError
+    if diameter == 0:
+        return np.zeros(len(others_x), dtype=bool)
+    if shape == 'square':
+        result = np.where(
+            others_shape == SHAPE_CODES['square'],
+            _square_square_mask(x, y, diameter,
+                                others_x, others_y, others_diameter),
+            _square_circle_mask(x, y, diameter,
+                                others_x, others_y, others_diameter))
+    else:
+        result = np.where(
+            others_shape == SHAPE_CODES['square'],
+            _square_circle_mask(others_x, others_y, others_diameter,
+                                x, y, diameter),
+            _circle_circle_mask(x, y, diameter,
+                                others_x, others_y, others_diameter))
+    return result & (others_diameter != 0)
+
+
+def _square_square_mask(x1, y1, d1, x2, y2, d2) -> np.ndarray:
+    """ Vectorized Collidable._square_square, the arguments can be scalars
+    or arrays
+    """
+    c1x = np.trunc(x1)
+    c1y = np.trunc(y1)
+    c2x = np.trunc(x2)
+    c2y = np.trunc(y2)
+    return (c1x > c2x - d1) & (c1y > c2y - d1) & \
+        (c1x - d2 + 1 < c2x) & (c1y - d2 + 1 < c2y)
+
+
+def _square_circle_mask(x1, y1, d1, x2, y2, d2) -> np.ndarray:
+    """ Vectorized Collidable._square_circle, (x1, y1, d1) is the square
+    and (x2, y2, d2) is the circle
+    """
+    radius = np.divide(d2, 2)
+    c1x = np.trunc(x1)
+    c1y = np.trunc(y1)
+    c2x = np.trunc(x2) + radius - 1
+    c2y = np.trunc(y2) + radius - 1
+    # The corner of the square closest to the centre when the centre is
+    # outside of the square on both axes
+    left = c1x > c2x
+    right = ~left & (c1x + d1 - 1 < c2x)
+    top = c1y > c2y
+    bottom = ~top & (c1y + d1 - 1 < c2y)
+    corner_x = np.where(left, c1x, c1x + d1 - 1)
+    corner_y = np.where(top, c1y, c1y + d1 - 1)
+    corner = np.sqrt((corner_x - c2x) ** 2 + (corner_y - c2y) ** 2) < radius
+    return np.where((left | right) & (top | bottom), corner,
+                    _square_square_mask(x1, y1, d1, x2, y2, d2))
+
+
+def _circle_circle_mask(x1, y1, d1, x2, y2, d2) -> np.ndarray:
+    """ Vectorized Collidable._circle_circle """
+    r1 = np.divide(d1, 2)
+    r2 = np.divide(d2, 2)
+    dx = np.trunc(x1 + r1 - 1) - np.trunc(x2 + r2 - 1)
+    dy = np.trunc(y1 + r1 - 1) - np.trunc(y2 + r2 - 1)
+    return np.sqrt(dx ** 2 + dy ** 2) < r1 + r2